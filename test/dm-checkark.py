@@ -124,6 +124,9 @@ along with this program.  If not, see https www gnu org licenses."""
     text_cdcd = lzw.decompress(text_cdc)
     if text_c != text_cdc or text != text_cd or text_cd != text_cdcd:
         error('LZW', 'error in compression/decompression')
+    chunks = list(lzw.decompress_chunks(lzw.compress(text * 16), chunk_size=256))
+    if b''.join(chunks) != text * 16 or len(chunks) < 2:
+        error('LZW', 'error in incremental decompression')
 
     # Archive
 
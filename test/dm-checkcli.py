@@ -4,7 +4,8 @@ import os
 import shutil
 
 from config import Dirs, Disks, Files, Masks, XDM99_CONFIG
-from utils import r, t, xdm, error, delfile, check_files_eq, check_file_matches, check_file_exists, content
+from utils import (r, t, xdm, error, delfile, check_files_eq, check_text_files_eq, check_file_matches,
+                   check_file_exists, content)
 
 
 # Check functions
@@ -387,6 +388,95 @@ def runtest():
         xdm('-', '-e', 'T', '-o', Files.output, stdin=fin)
     check_files_eq('stdin/stdout', Files.output, ref, 'P')
 
+    # batch commands
+    shutil.copyfile(Disks.recsgen, Disks.work)
+    shutil.copyfile(Disks.recsgen, Disks.tifiles)
+    xdm(Disks.tifiles, '-a', ref_prog, '-n', 'NEWPROG')
+    xdm(Disks.tifiles, '-r', 'DF127X001:RENAMED', 'DV064X010:OTHER')
+    xdm(Disks.tifiles, '-w', 'RENAMED')
+    xdm(Disks.tifiles, '-d', 'PROG*', 'D?010X060')
+    xdm(Disks.tifiles, '-e', 'OTHER', '-o', Files.reference)
+    with open(Files.input, 'w') as f:
+        f.write(f'-a {ref_prog} -n NEWPROG\n\n'
+                '-r DF127X001:RENAMED DV064X010:OTHER  # two files\n'
+                '-w RENAMED\n'
+                '-d "PROG*" "D?010X060"\n'
+                f'-e OTHER -o {Files.output}\n')
+    xdm(Disks.work, '-B', Files.input)
+    check_files_eq('batch', Files.output, Files.reference, 'P')
+    with open(Files.output, 'w') as f1, open(Files.reference, 'w') as f2:
+        xdm(Disks.work, '-i', stdout=f1)
+        xdm(Disks.tifiles, '-i', stdout=f2)
+    with open(Files.output, 'r') as f1, open(Files.reference, 'r') as f2:
+        if [line[:50] for line in f1] != [line[:50] for line in f2]:  # ignore timestamps
+            error('batch', 'Catalog mismatch')
+
+    shutil.copyfile(Disks.recsgen, Disks.work)
+    with open(Files.input, 'w') as f:
+        f.write('-d PROG00255\n-r DF127X001:RENAMED\n-r NONEXIST:FOO\n')
+    with open(Files.input, 'r') as fin, open(Files.error, 'w') as ferr:
+        xdm(Disks.work, '-B', '-', stdin=fin, stderr=ferr, rc=1)
+    check_files_eq('batch', Disks.work, Disks.recsgen, 'P')
+    with open(Files.input, 'w') as f:
+        f.write('-d PROG00255\n--initialize sssd\n')
+    with open(Files.error, 'w') as ferr:
+        xdm(Disks.work, '-B', Files.input, stderr=ferr, rc=1)
+    check_files_eq('batch', Disks.work, Disks.recsgen, 'P')
+
+    # bulk processing
+    bulk = t('bulk')
+    os.makedirs(os.path.join(bulk, 'sub'), exist_ok=True)
+    shutil.copyfile(Disks.recsgen, os.path.join(bulk, 'recsgen.dsk'))
+    shutil.copyfile(os.path.join(Dirs.disks, 'basic1.dsk'), os.path.join(bulk, 'sub', 'basic1.dsk'))
+    with open(os.path.join(bulk, 'invalid.dsk'), 'w') as f:
+        f.write('invalid')
+    with open(Files.reference, 'w') as fout:
+        for disk in (os.path.join(bulk, 'recsgen.dsk'), os.path.join(bulk, 'sub', 'basic1.dsk')):
+            fout.write(disk + ':\n')
+            fout.flush()
+            xdm(disk, '-i', stdout=fout)
+    with open(Files.output, 'w') as fout, open(Files.error, 'w') as ferr:
+        xdm('--bulk', bulk, '-j', '2', stdout=fout, stderr=ferr, rc=1)
+    check_text_files_eq('bulk', Files.output, Files.reference)
+    check_file_matches(Files.error, [(0, 'invalid.dsk: Error: Invalid disk image')])
+    with open(Files.error, 'w') as ferr:
+        xdm('--bulk', bulk, '-e', 'PROG0025?', 'NUMBERS-L*', '-o', t('bulkout'), stderr=ferr, rc=1)
+    xdm(Disks.recsgen, '-e', 'PROG00255', '-o', Files.reference)
+    check_files_eq('bulk', os.path.join(t('bulkout'), 'recsgen', 'prog00255'), Files.reference, 'P')
+    check_file_exists(os.path.join(t('bulkout'), 'sub', 'basic1', 'numbers-l'))
+    with open(Files.error, 'w') as ferr:
+        xdm('--bulk', os.path.join(bulk, 'recsgen.dsk'), '-C', stderr=ferr, rc=0)
+        xdm('--bulk', bulk, '-d', 'PROG00255', stderr=ferr, rc=1)
+        xdm('--bulk', bulk, '-j', 'X', stderr=ferr, rc=1)
+
+    # catalog index
+    index = t('index.db')
+    delfile(index)
+    with open(Files.output, 'w') as fout, open(Files.error, 'w') as ferr:
+        xdm('--index', bulk, '--index-file', index, stdout=fout, stderr=ferr, rc=1)
+        xdm('--index', bulk, '--index-file', index, stdout=fout, stderr=ferr, rc=0)  # unchanged
+    check_file_matches(Files.output, [(0, '^2 images indexed'), (1, '^0 images indexed, 0 images removed')])
+    check_file_matches(Files.error, [(0, 'invalid.dsk: Invalid disk image')])
+    with open(Files.output, 'w') as fout:
+        xdm('--find', 'PROG0025?', 'NUMBERS*', '--index-file', index, stdout=fout)
+    check_file_len(Files.output, 5, 5)
+    check_file_matches(Files.output, [(1, r'recsgen.dsk: PROG00255\s+2\s+PROGRAM\s+255 B$'),
+                                      (2, r'basic1.dsk: NUMBERS\s+4\s+PROGRAM\s+732 B$'),
+                                      (3, r'basic1.dsk: NUMBERS-L\s+5\s+DIS/VAR 80\s+819 B\s+21 recs$')])
+    with open(Files.output, 'w') as fout:
+        xdm('--find', 'NUMBERS*', '-f', 'dv80', '--index-file', index, stdout=fout)
+    check_file_len(Files.output, 1, 1)
+    xdm(os.path.join(bulk, 'recsgen.dsk'), '-r', 'PROG00255:RENAMED')
+    os.remove(os.path.join(bulk, 'sub', 'basic1.dsk'))
+    with open(Files.output, 'w') as fout, open(Files.error, 'w') as ferr:
+        xdm('--index', bulk, '--index-file', index, '--find', 'PROG0025?', 'REN*', stdout=fout, stderr=ferr)
+    check_file_matches(Files.output, [(0, '^1 images indexed, 1 images removed'),
+                                      (1, 'recsgen.dsk: PROG00254'), (2, 'recsgen.dsk: RENAMED')])
+    check_file_len(Files.output, 3, 3)
+
+    shutil.rmtree(bulk)
+    shutil.rmtree(t('bulkout'))
+
     # usage errors
     with open(Files.error, 'w') as ferr:
         xdm('-a', Files.output, stderr=ferr, rc=2)
@@ -143,6 +143,50 @@ def runtest():
         check_files_eq('Write records', Files.output, path, fmt)
         xdm(Disks.work, '-d', name)
 
+    # incremental allocation: files keep their sectors, new files fill holes
+    shutil.copyfile(Disks.blank, Disks.work)
+    holes = [create_binary_file(size) for size in range(10240, 10240 + 8)]
+    for name, path, fmt in holes:
+        xdm(Disks.work, '-a', path, '-f', fmt)
+    with open(Disks.work, 'rb') as f:
+        before = f.read()
+    xdm(Disks.work, '-d', *[name for name, _, _ in holes[1::2]])
+    with open(Disks.work, 'rb') as f:
+        after = f.read()
+    for i in range(512, len(before), 256):
+        if after[i:i + 256] != before[i:i + 256] and after[i:i + 256] != b'\xe5' * 256:
+            error('Incremental', f'Sector {i // 256} of remaining file changed')
+    name, path, fmt = bigFiles[-1]  # requires several holes
+    xdm(Disks.work, '-a', path, '-f', fmt)
+    for name, path, fmt in [bigFiles[-1]] + holes[::2]:
+        xdm(Disks.work, '-e', name, '-o', Files.output)
+        check_files_eq('Incremental', Files.output, path, fmt)
+    with open(Files.error, 'w') as ferr:
+        xdm(Disks.work, '-C', stderr=ferr)
+
+    # free sectors too fragmented for single FDR: disk gets compacted
+    xdm('-X', 'dssd', Disks.work)
+    smalls = [create_binary_file(size) for size in range(128, 128 + 127)]
+    xdm(Disks.work, '-a', *[path for _, path, _ in smalls], '-f', 'PROGRAM')
+    xdm(Disks.work, '-d', *[name for name, _, _ in smalls[::2]])
+    big = create_binary_file(590 * 256)
+    xdm(Disks.work, '-a', big[1], '-f', 'PROGRAM')
+    for name, path, fmt in [big] + smalls[1::2]:
+        xdm(Disks.work, '-e', name, '-o', Files.output)
+        check_files_eq('Compact', Files.output, path, fmt)
+    with open(Files.error, 'w') as ferr:
+        xdm(Disks.work, '-C', stderr=ferr)
+
+    # failed add leaves disk unchanged
+    with open(Disks.work, 'rb') as f:
+        before = f.read()
+    huge = create_binary_file(700 * 256)
+    xdm(Disks.work, '-a', huge[1], '-f', 'PROGRAM', rc=1)
+    with open(Disks.work, 'rb') as f:
+        if f.read() != before:
+            error('Compact', 'Failed add modified disk')
+    xdm(Disks.work, '-d', big[0])
+
     # check truncating of DIS/VAR files with long records
     path = r('vardis')
     with open(path, 'r') as f:
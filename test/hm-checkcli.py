@@ -67,6 +67,19 @@ def runtest():
     ref = os.path.join(Dirs.refs, 'v10r.txt')
     check_bin_text_eq('HFE', Files.output, ref)
 
+    # modified tracks only
+    xhm('-F', Disks.work, '-o', Files.reference)
+    xdm(Files.reference, '-r', 'TESTFILE:RENAMED')
+    xhm('-T', Files.reference, '-o', Files.output)  # fully re-encoded
+    with open(Disks.work, 'rb') as f:
+        original = f.read()
+    xhm(Disks.work, '-r', 'TESTFILE:RENAMED')
+    check_files_eq('HFE', Disks.work, Files.output, 'PROGRAM')
+    with open(Disks.work, 'rb') as f:
+        changed = [i for i, (a, b) in enumerate(zip(original, f.read())) if a != b]
+    if not changed or changed[-1] - changed[0] > 2 * 12544:  # single cylinder
+        error('HFE', 'Modified tracks not written back in place')
+
     # image resize
     with open(Files.output, 'w') as fout:
         xhm('--hfe-info', Disks.work, stdout=fout)
@@ -98,6 +111,26 @@ def runtest():
     if content_lines(Files.output)[:10] != 'DISKNAME  ':
         error('init', 'Incorrect disk name when initializing')
 
+    # sector CRCs
+    with gzip.open(Disks.hfe, 'rb') as fin:
+        image = bytearray(fin.read())
+    with open(Files.input, 'wb') as fout:
+        fout.write(image)
+    with open(Files.error, 'w') as ferr:
+        xhm('-V', Files.input, stderr=ferr)
+    if content_len(Files.error) > 0:
+        error('CRC', 'CRC errors reported for valid image')
+    image[1024 + 232] ^= 0x80  # data bit in first sector of track 0
+    with open(Files.input, 'wb') as fout:
+        fout.write(image)
+    with open(Files.error, 'w') as ferr:
+        xhm('-V', Files.input, stderr=ferr, rc=1)
+    check_file_contains(Files.error, 'CRC error in data field of sector 0')
+    with open(Files.output, 'w') as fout, open(Files.error, 'w') as ferr:
+        xhm(Files.input, stdout=fout, stderr=ferr)
+    check_file_contains(Files.output, 'HFEFILE')
+    check_file_contains(Files.error, 'Warning: .*CRC error in data field of sector 0')
+
     # messy stuff
     xdm(Disks.work, '-X', 'sssd')
     xdm(Disks.work, '-q', '--set-geometry', 'dssd')  # image too short now!
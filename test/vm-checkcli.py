@@ -2,10 +2,11 @@
 
 import os
 import shutil
+import sqlite3
 
 from config import Dirs, Disks, Files, XVM99_CONFIG
-from utils import (xvm, xdm, error, r, clear_env, delfile, check_files_eq, check_binary_files_eq, content_len,
-                   content_line_array)
+from utils import (xvm, xdm, error, r, clear_env, delfile, check_files_eq, check_binary_files_eq,
+                   check_text_files_eq, content_len, content_line_array)
 
 
 # Check functions
@@ -28,6 +29,7 @@ def runtest():
     """check command line interface"""
 
     clear_env(XVM99_CONFIG)
+    os.environ['XDG_CACHE_HOME'] = Dirs.tmp  # keep volume cache local
 
     # setup
     with open(Disks.volumes, 'wb') as v:
@@ -46,6 +48,29 @@ def runtest():
         xvm(Disks.volumes, '4', stdout=fout)
         xvm(Disks.volumes, '5', '-i', stderr=fout, rc=1)
 
+    # cached volume directory
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '1-5', '--no-cache', stdout=fout)
+    with open(Files.reference, 'w') as fout:
+        xvm(Disks.volumes, '1-5', stdout=fout)  # from cache
+    check_text_files_eq('cache', Files.output, Files.reference)
+    with open(Files.reference, 'w') as fout:
+        xvm(Disks.volumes, '1-5', '-j', '3', '--no-cache', stdout=fout)
+    check_text_files_eq('cache', Files.output, Files.reference)
+    if os.path.exists('/dev/zero'):
+        with open(Files.output, 'w') as fout:
+            xvm('/dev/zero', '1', stdout=fout)  # special files are not cached
+        with sqlite3.connect(os.path.join(Dirs.tmp, 'xdt99', 'xvm99-volumes.db')) as db:
+            if db.execute('SELECT * FROM devices WHERE path = ?', ('/dev/zero',)).fetchall():
+                error('cache', 'Special file cached')
+    xvm(Disks.volumes, '2', '-X', 'CF', '-q')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '2-3', stdout=fout)
+    lines = content_line_array(Files.output, strip=True)
+    if not lines[0].startswith('[   2]') or lines[0].split()[-4] != '2' or lines[1].split()[-4] == '2':
+        error('cache', 'Stale volume directory after write')
+    xvm(Disks.volumes, '2', '-w', Disks.work, '--keep-size')
+
     xvm(Disks.volumes, '2', '-r', Files.output)
     check_files_eq('xvm', Files.output, Disks.work, 'P')
     xvm(Disks.volumes, '1', '-r', Files.output)
@@ -68,6 +93,8 @@ def runtest():
     check_files_eq('xvm', Files.output, Disks.work, 'P')
 
     xvm(Disks.volumes, '3', '-w', Disks.work)
+    xvm(Disks.volumes, '4', '-r', Files.output)
+    check_files_eq('xvm', Files.output, Disks.recsgen, 'P')  # resized volume must not spill over
     xvm(Disks.volumes, '3', '-a', ref, '-f', 'DF80', '-n', 'REFFILE', '-q')
     xvm(Disks.volumes, '3', '-r', Files.output)
     xdm(Files.output, '-e', 'REFFILE', '-q', '-o', Files.reference)
@@ -113,6 +140,71 @@ def runtest():
     xvm(Disks.volumes, '2', '-e', 'ARK', '-o', Files.output, '-q')
     check_binary_files_eq('archives', Files.output, Files.reference)
 
+    # parallel delegation
+    xvm(Disks.volumes, '1-4', '-X', 'CF', '-j', '2', '-q')
+    xvm(Disks.volumes, '1-4', '-a', Files.reference, '-n', 'PARALLEL', '-j', '2', '-q')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '1-4', '-i', '-j', '2', '-q', stdout=fout)
+    if sum(1 for line in content_line_array(Files.output) if line.startswith('PARALLEL')) != 4:
+        error('parallel', 'Incorrect catalogs of delegated volumes')
+    for volume in '1', '4':
+        xvm(Disks.volumes, volume, '-e', 'PARALLEL', '-o', Files.output)
+        check_binary_files_eq('parallel', Files.output, Files.reference)
+
+    # changed sectors only
+    with open(Disks.volumes, 'rb') as f:
+        before = f.read()
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '2', '-d', 'PARALLEL', '--dry-run', stdout=fout)
+    with open(Disks.volumes, 'rb') as f:
+        if f.read() != before:
+            error('dry run', 'Volume modified')
+    count = int(content_line_array(Files.output)[0].split()[2])
+    xvm(Disks.volumes, '2', '-d', 'PARALLEL')
+    with open(Disks.volumes, 'rb') as f:
+        after = f.read()
+    changed = [i for i in range(0, len(before), 512) if before[i:i + 512] != after[i:i + 512]]
+    if not 0 < len(changed) <= count or not all(1600 * 512 <= i < 2 * 1600 * 512 for i in changed):
+        error('write back', f'Unexpected sectors written: {len(changed)} of {count}')
+
+    # catalog index
+    index = os.path.join(Dirs.tmp, 'index.db')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '1-5', '--index', '--index-file', index, '--find', 'PARALLEL', stdout=fout)
+    lines = content_line_array(Files.output, strip=True)
+    if lines[0] != '4 volumes indexed, 0 volumes removed' or [line[:16] for line in lines[1:]] != [
+            '[   1]  PARALLEL', '[   3]  PARALLEL', '[   4]  PARALLEL']:
+        error('index', 'Incorrect index of volumes')
+    xvm(Disks.volumes, '3', '-d', 'PARALLEL')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '1-5', '--index', '--index-file', index, '--find', 'PAR*', stdout=fout)
+    lines = content_line_array(Files.output, strip=True)
+    if lines[0] != '1 volumes indexed, 0 volumes removed' or [line[:16] for line in lines[1:]] != [
+            '[   1]  PARALLEL', '[   4]  PARALLEL']:
+        error('index', 'Incorrect refresh of volume index')
+    with open(Files.output, 'w') as fout:
+        xdm('--index', Dirs.tmp, '--index-file', index, stdout=fout)  # folder of device
+    if not content_line_array(Files.output, strip=True)[0].endswith(' 0 images removed'):
+        error('index', 'Volumes removed by xdm99')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '1-5', '--find', 'PAR*', '--index-file', index, stdout=fout)
+    lines = content_line_array(Files.output, strip=True)
+    if [line[:16] for line in lines] != ['[   1]  PARALLEL', '[   4]  PARALLEL']:
+        error('index', 'Incorrect volume index after xdm99 refresh')
+
+    # changed sectors only for volumes keeping their size
+    xvm(Disks.volumes, '2', '-w', Disks.work, '--keep-size')
+    with open(Files.reference, 'w') as f:
+        f.write('contents')
+    with open(Files.output, 'w') as fout:
+        xvm(Disks.volumes, '2', '-a', Files.reference, '-n', 'KEPT', '--keep-size', '--dry-run', stdout=fout)
+    count = int(content_line_array(Files.output)[0].split()[2])
+    if not 0 < count <= 4:  # file, FDR, allocation map, FDR index
+        error('keep size', f'Unexpected number of sectors to write: {count}')
+    xvm(Disks.volumes, '2', '-a', Files.reference, '-n', 'KEPT', '--keep-size')
+    xvm(Disks.volumes, '2', '-e', 'KEPT', '-o', Files.output)
+    check_binary_files_eq('keep size', Files.output, Files.reference)
+
     # default options
     xdm(Files.output, '-q', '-X', 'CF')
     with open(Files.reference, 'w') as f:
@@ -135,6 +227,7 @@ def runtest():
         error('defaults', 'default options override not working')
 
     # cleanup
+    shutil.rmtree(os.path.join(Dirs.tmp, 'xdt99'), ignore_errors=True)
     delfile(Dirs.tmp)
 
 
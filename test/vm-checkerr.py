@@ -13,6 +13,7 @@ def runtest():
     """check error handling"""
 
     # setup
+    os.environ['XDG_CACHE_HOME'] = Dirs.tmp  # keep volume cache local
     with open(Disks.volumes, 'wb') as v:
         for i in range(4 * 1600):
             v.write(bytes(2 * 256))  # Disk.bytes_per_sector plus padding
@@ -65,6 +66,7 @@ def runtest():
     os.remove(Files.input)
     os.remove(Disks.work)
     os.remove(Disks.volumes)
+    shutil.rmtree(os.path.join(Dirs.tmp, 'xdt99'), ignore_errors=True)
 
 
 if __name__ == '__main__':
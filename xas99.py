@@ -25,6 +25,7 @@ import math
 import os
 import argparse
 import zipfile
+import bisect
 from functools import reduce
 from xcommon import Util, RFile, CommandProcessor, Warnings, Console
 
@@ -936,7 +937,10 @@ class Symbols:
         self.symbol_def_location = {}  # symbol locations (lino, filename)
         self.saved_LC = {True: 0, False: 0}  # key == relocatable
         self.xops = {}
-        self.locations = []
+        self.locations = []  # lidx of labels, sorted
+        self.location_names = []  # names of labels in order of locations
+        self.label_locations = {}  # name: lidx of label
+        self.local_locations = {}  # local name: (sorted lidx of local labels, names of local labels)
         self.unit_id = Symbols.g_unit_id
         Symbols.g_unit_id += 1
         self.local_lid = 0
@@ -1063,12 +1067,23 @@ class Symbols:
                        self.segment_reloc and (real_LC or not self.xorg_offset),
                        self.unit_id)
         name = self.add_symbol(label, addr, lino=lino, filename=filename, tracked=tracked, check=check)
-        self.locations.append((self.lidx, name))
+        Symbols.insert_location(self.locations, self.location_names, self.lidx, name)
+        self.label_locations.setdefault(name, self.lidx)
 
     def add_local_label(self, label):
         """add a new local label symbol to symbol table"""
         self.local_lid += 1
-        self.add_label('_%l' + label + '$' + str(self.local_lid), check=False)
+        name = '_%l' + label + '$' + str(self.local_lid)
+        self.add_label(name, check=False)
+        lidxs, names = self.local_locations.setdefault(label, ([], []))
+        Symbols.insert_location(lidxs, names, self.lidx, name)
+
+    @staticmethod
+    def insert_location(lidxs, names, lidx, name):
+        """insert label into locations sorted by lidx, after labels of the same lidx"""
+        i = bisect.bisect_right(lidxs, lidx)
+        lidxs.insert(i, lidx)
+        names.insert(i, name)
 
     def add_register_alias(self, alias, register, nocheck=False):
         """add a new register alias"""
@@ -1131,15 +1146,12 @@ class Symbols:
 
     def get_locals(self, name, distance):
         """return local label specified by current position and distance +/-n"""
-        targets = [(loc, sym) for (loc, sym) in self.locations if sym[3:len(name) + 4] == name + '$']
-        try:
-            i, lidx = next((j, loc) for j, (loc, name) in enumerate(targets) if loc >= self.lidx)
-            if distance > 0 and lidx > self.lidx:
-                distance -= 1  # i points to +! unless lidx == self.lidx
-        except StopIteration:
-            i = len(targets)  # beyond last label
+        lidxs, names = self.local_locations.get(name, ((), ()))
+        i = bisect.bisect_left(lidxs, self.lidx)  # first label at or after current line, or beyond last label
+        if distance > 0 and i < len(lidxs) and lidxs[i] > self.lidx:
+            distance -= 1  # i points to +! unless lidx == self.lidx
         try:
-            _, fullname = targets[i + distance]
+            fullname = names[i + distance]
         except IndexError:
             return None
         return self.get_symbol(fullname)
@@ -1147,13 +1159,12 @@ class Symbols:
     def get_size(self, name):
         """return byte distance of given symbol to next defined symbol"""
         try:
-            lpos = next(loc for (loc, sym) in self.locations if sym == name)
-        except StopIteration:
+            lpos = self.label_locations[name]
+        except KeyError:
             raise AsmError('Unknown label: ' + name)
         try:
-            _, next_name = min(((loc - lpos, sym) for (loc, sym) in self.locations if loc > lpos),
-                               key=lambda x: x[0])
-        except ValueError:
+            next_name = self.location_names[bisect.bisect_right(self.locations, lpos)]  # first label after lpos
+        except IndexError:
             raise AsmError('Cannot determine size of symbol: ' + name)
         sym_addr, next_addr = self.get_symbol(name), self.get_symbol(next_name)
         return Address.val(next_addr) - Address.val(sym_addr)
@@ -1461,6 +1472,7 @@ class Parser:
         self.r_prefix = r_prefix
         self.bank_cross_check = bank_cross_check
         self.text_literals = []
+        self.expressions = {}  # tokenized expressions, see tokenize()
         self.intermediate_source = []  # parsed source by pass 1
         self.filename = None
         self.source = None
@@ -1678,15 +1690,19 @@ class Parser:
         """parse complex arithmetical expression"""
         if self.symbols.pass_no == 1 and not well_defined:
             return 0
+        try:
+            terms, literals, violation = self.expressions[expr]
+        except KeyError:
+            terms, literals, violation = self.expressions[expr] = self.tokenize(expr)
+        if violation and self.symbols.pass_no > 1:
+            self.console.warn('Expression with non-standard evaluation', category=Warnings.ARITH)
         value = Word(0)
         stack = []
         reloc_count = 0
-        sep_pattern = r'([-+*/])' if self.strict else r'([-+~&|^()]|\*\*?|//?|%%?|<<|>>|[BW]#)'
-        terms = ['+'] + [tok.strip() for tok in re.split(sep_pattern, expr)]
-        self.check_arith_precedence(terms)
         i = 0
         while i < len(terms):
             op, term = terms[i:i + 2]
+            t = i + 1  # index of current term
             i += 2
             negate = False
             complement_correction = 0
@@ -1701,6 +1717,7 @@ class Parser:
                 # unary operators
                 while not term and i < len(terms) and terms[i] in '+-~(':
                     term = terms[i + 1]
+                    t = i + 1
                     if terms[i] == '-':
                         negate = not negate
                     elif terms[i] == '~':
@@ -1719,8 +1736,11 @@ class Parser:
                         reloc_count = 0
                     i += 2
                 # process next term between operators
-                term_val, x_bank_access = self.term(term, well_defined=well_defined, iop=iop, relaxed=relaxed,
-                                                    allow_r0=allow_r0)
+                if literals[t] is not None:
+                    term_val, x_bank_access = literals[t], False
+                else:
+                    term_val, x_bank_access = self.term(term, well_defined=well_defined, iop=iop, relaxed=relaxed,
+                                                        allow_r0=allow_r0)
                 if isinstance(term_val, Local):
                     dist = -term_val.distance if negate else term_val.distance
                     term_val = self.symbols.get_locals(term_val.name, dist)
@@ -1784,6 +1804,28 @@ class Parser:
             raise AsmError('Invalid address: ' + expr)
         return Address(value.value, self.symbols.bank, True, self.symbols.unit_id) if reloc_count else value.value
 
+    def tokenize(self, expr):
+        """split expression into operators and terms, and pre-evaluate numeric literals"""
+        sep_pattern = r'([-+*/])' if self.strict else r'([-+~&|^()]|\*\*?|//?|%%?|<<|>>|[BW]#)'
+        terms = ['+'] + [tok.strip() for tok in re.split(sep_pattern, expr)]
+        literals = [self.literal(term) if term[:1] in '>:0123456789' and term else None for term in terms]
+        violation, _ = self.check_arith_precedence(terms)
+        return terms, literals, violation
+
+    @staticmethod
+    def literal(op):
+        """return value of valid numeric literal, or None for anything else"""
+        try:
+            if op[0] == '>':
+                return int(op[1:], 16)
+            elif op[0] == ':':
+                return int(op[1:], 2)
+            elif op.isdigit():
+                return int(op)
+        except ValueError:
+            pass  # reported by term()
+        return None
+
     def check_arith_precedence(self, operators, i=2):
         """check if usual * over + arithmetic precedence is violated"""
         possible_violation = False
@@ -1798,8 +1840,6 @@ class Parser:
             elif op == '+' or op == '-':
                 possible_violation = True
             elif op in '*/%' and possible_violation:
-                if self.symbols.pass_no > 1:
-                    self.console.warn('Expression with non-standard evaluation', category=Warnings.ARITH)
                 return True, None
             elif op == '(':
                 violation, i = self.check_arith_precedence(operators, i + 2)
@@ -26,6 +26,7 @@ import re
 import argparse
 import glob
 import platform
+import mmap
 
 
 # xdt99 common assets
@@ -423,11 +424,8 @@ class Util:
     @staticmethod
     def chop(s, n):
         """generator that produces n-sized parts of s"""
-        while True:
-            part, s = s[:n], s[n:]
-            if not part:
-                break
-            yield part
+        for i in range(0, len(s), n):
+            yield s[i:i + n]
 
     @staticmethod
     def flatten(list_of_lists):
@@ -466,6 +464,15 @@ class Util:
             return filename + suffix + ext
         return altname or output
 
+    @staticmethod
+    def cache_filename(name):
+        """return location of file in user cache directory"""
+        if os.name == 'nt':
+            cache = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache, 'xdt99', name)
+
     @staticmethod
     def tiname(s, n=0):
         """create TI filename from local filename"""
@@ -520,6 +527,19 @@ class Util:
                     data = f.read()
         return data
 
+    @staticmethod
+    def mapdata(filename):
+        """map file into memory as private copy-on-write buffer, or read data if file cannot be mapped
+           Pages are only read when accessed, and changes are never written back to the file.
+        """
+        if filename == '-':
+            return Util.readdata(filename)
+        with open(filename, 'rb') as f:
+            try:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            except (ValueError, OSError):
+                return f.read()  # empty file or special file
+
     @staticmethod
     def writedata(filename, data, istext=False, encoding=None):
         """write data to file or STDOUT
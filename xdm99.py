@@ -24,6 +24,13 @@ import re
 import datetime
 import os
 import argparse
+import shlex
+import mmap
+import hashlib
+import sqlite3
+import multiprocessing
+from copy import copy
+from functools import partial
 from xcommon import Util, RContainer, CommandProcessor, GlobStore, Console, Warnings
 
 
@@ -38,6 +45,70 @@ class ContainerError(Exception):
     pass
 
 
+class AllocationMap:
+    """sector allocation bitmap as integer, bit n is set if sector n is used"""
+
+    def __init__(self, bitmap=b'', size=None):
+        self.size = len(bitmap) if size is None else size  # in bytes
+        self.bits = int.from_bytes(bitmap, 'little')
+
+    @staticmethod
+    def mask(start, count):
+        """return bit mask for sector range"""
+        return ((1 << count) - 1) << start if count > 0 else 0
+
+    @staticmethod
+    def popcount(value):
+        """return number of set bits"""
+        return bin(value).count('1')
+
+    @staticmethod
+    def sectors(value):
+        """return sector numbers of set bits in ascending order"""
+        while value:
+            low = value & -value
+            yield low.bit_length() - 1
+            value ^= low
+
+    def count(self, start=0, end=None):
+        """return number of used sectors in range"""
+        end = self.size * 8 if end is None else end
+        return AllocationMap.popcount(self.bits & AllocationMap.mask(start, end - start))
+
+    def unused(self, mask):
+        """return sectors in mask that are not marked as used"""
+        return mask & ~self.bits
+
+    def set(self, start, count, used=True):
+        """mark sector range as used or free"""
+        if used:
+            self.bits |= AllocationMap.mask(start, count)
+        else:
+            self.bits &= ~AllocationMap.mask(start, count)
+
+    def free_extents(self, start, end):
+        """return unused sector ranges in [start, end) as list of (start sector, sector count)"""
+        extents = []
+        free = self.unused(AllocationMap.mask(start, end - start))
+        while free:
+            first = (free & -free).bit_length() - 1
+            run = free >> first
+            count = (run ^ (run + 1)).bit_length() - 1  # trailing ones
+            extents.append((first, count))
+            free &= ~AllocationMap.mask(first, count)
+        return extents
+
+    def copy(self):
+        """return independent copy of bitmap"""
+        alloc_map = AllocationMap(size=self.size)
+        alloc_map.bits = self.bits
+        return alloc_map
+
+    def to_bytes(self):
+        """return bitmap as stored on disk"""
+        return (self.bits & AllocationMap.mask(0, self.size * 8)).to_bytes(self.size, 'little')
+
+
 class Disk:
     """sector-based TI disk image file"""
 
@@ -61,13 +132,20 @@ class Disk:
     RESERVED = 0x14
     DATA = 0x100
 
+    FIRST_DATA_SECTOR = 0x22  # preferred start of file contents, FDRs go below
+    MAX_CLUSTERS = (BYTES_PER_SECTOR - 0x1c) // 3
+    MAX_FILES = BYTES_PER_SECTOR // 2 - 1
+
     def __init__(self, image, console, init=False):
         if len(image) < 2 * Disk.BYTES_PER_SECTOR:
             raise ContainerError('Invalid disk image')
-        self.image = image
+        # mutable sector store, updated in place; mapped images are copy-on-write
+        self.image = bytearray(image) if isinstance(image, bytes) else image
         self.console = console
         self.catalog = {}
-        self.read_sectors = []
+        self.fdr_sectors = {}  # FDR sector of each file in catalog
+        self.claims = []  # sector ranges read for FDRs and files: (start sector, sector count, name)
+        self.dirty_sectors = set()  # sectors modified since image was loaded
         # meta data
         sector_0 = self.get_sector(0)
         if sector_0[0] == 0x00 and sector_0[21:23] == b'\x00\xfe':
@@ -84,17 +162,14 @@ class Disk:
         self.tracks_per_side = sector_0[Disk.TRACKS_PER_SIDE]
         self.sides = sector_0[Disk.SIDES]
         self.density = sector_0[Disk.DENSITY]
-        self.alloc_bitmap = sector_0[Disk.ALLOC_BITMAP:]
+        self.alloc_map = AllocationMap(sector_0[Disk.ALLOC_BITMAP:])
         if self.dsk_id != b'DSK':
             self.console.warn('Disk image not initialized', category=Warnings.IMAGE)
         if len(self.image) < self.total_sectors * Disk.BYTES_PER_SECTOR:
             self.console.warn('Disk image truncated', category=Warnings.IMAGE)
-        self.used_sectors = 0
-        try:
-            for i in range(Util.used(self.total_sectors, 8)):
-                self.used_sectors += bin(self.alloc_bitmap[i]).count('1')
-        except IndexError:
+        if Util.used(self.total_sectors, 8) > self.alloc_map.size:
             self.console.warn('Allocation map corrupted', category=Warnings.ALLOCATION)
+        self.used_sectors = self._count_used_sectors()
         self._check_geometry()
         self._init_catalog()
         self._check_allocation()
@@ -153,7 +228,7 @@ class Disk:
             self.console.warn('Sector count is not multiple of 8', category=Warnings.GEOMETRY)
 
     def _init_catalog(self):
-        """read all files from disk"""
+        """read all file descriptors from disk, file contents are loaded on demand"""
         sector_1 = self.get_sector(1)
         sector_count = 0
         for i in range(0, Disk.BYTES_PER_SECTOR, 2):
@@ -162,69 +237,97 @@ class Disk:
             if fd_index == 0:
                 break
             try:
-                fd_sector = self.get_sector(fd_index, b'FDR#%d' % fd_index)
+                fd_sector = self.get_sector(fd_index, f'FDR#{fd_index}')
             except IndexError:
                 self.console.warn('File descriptor index corrupted')
                 continue
             fd = FileDescriptor.create_from_fdr_sector(fd_sector)
-            # get file contents
-            data = self._read_file(fd)
-            self.catalog[fd.name] = File(fd=fd, data=data, console=self.console)
+            # defer reading of file contents
+            extents = self._get_file_extents(fd)
+            self.catalog[fd.name] = File(fd=fd, loader=partial(self._read_sectors, extents), console=self.console)
+            self.fdr_sectors[fd.name] = fd_index
             sector_count += fd.total_sectors + 1
         # consistency check
         if sector_count != self.used_sectors - 2:
             self.console.warn('Used sector mismatch: found {} file sectors, expected {}'.format(
                 sector_count, self.used_sectors - 2))
 
-    def _read_file(self, fd):
-        """read file contents based on FDR cluster data"""
-        parts = []
+    @staticmethod
+    def decode_clusters(clusters):
+        """return FDR cluster data as list of (start sector, sector count)"""
+        extents = []
         offset = -1
-        for i in range(0, len(fd.clusters) - 2, 3):
-            start = fd.clusters[i] | (fd.clusters[i + 1] & 0x0f) << 8
+        for i in range(0, len(clusters) - 2, 3):
+            start = clusters[i] | (clusters[i + 1] & 0x0f) << 8
             if start == 0:
                 break
             prev_offset = offset
-            offset = fd.clusters[i + 1] >> 4 | fd.clusters[i + 2] << 4
-            for j in range(offset - prev_offset):
-                try:
-                    parts.append(self.get_sector(start + j, fd.name))
-                except IndexError:
-                    self.console.warn(f'{fd.name:s}: File contents corrupted')
-                    fd.error = True
-                    continue
-        data = b''.join(parts)
-        return data
+            offset = clusters[i + 1] >> 4 | clusters[i + 2] << 4
+            extents.append((start, offset - prev_offset))
+        return extents
+
+    @staticmethod
+    def encode_clusters(extents):
+        """return list of (start sector, sector count) as FDR cluster data"""
+        if len(extents) > Disk.MAX_CLUSTERS:
+            raise ContainerError('File too fragmented')
+        clusters = bytearray()
+        offset = -1
+        for start, count in extents:
+            offset += count
+            clusters.extend((start & 0xff, start >> 8 | (offset & 0xf) << 4, offset >> 4))
+        return bytes(clusters) + bytes(Disk.BYTES_PER_SECTOR - 0x1c - len(clusters))
+
+    def _get_file_extents(self, fd):
+        """get sector ranges of file contents based on FDR cluster data"""
+        extents = []
+        for start, count in Disk.decode_clusters(fd.clusters):
+            if count <= 0:
+                continue
+            valid = self._check_sectors(start, count, fd.name)
+            if valid < count:
+                self.console.warn(f'{fd.name:s}: File contents corrupted')
+                fd.error = True
+            if valid:
+                extents.append((start, valid))
+        return extents
+
+    def _read_sectors(self, extents):
+        """read file contents from given sector ranges"""
+        return b''.join(self.image[start * Disk.BYTES_PER_SECTOR:(start + count) * Disk.BYTES_PER_SECTOR]
+                        for start, count in extents)
 
     def _check_allocation(self):
         """check sector allocation for consistency"""
-        reads = {n: [] for n in range(self.total_sectors)}
-        allocated = []
-        for i in range(Util.used(self.total_sectors, 8)):
-            try:
-                b = self.alloc_bitmap[i]
-            except IndexError:
-                break
-            for bit in range(8):
-                allocated.append(b & (1 << bit) != 0)
-        # unallocated sectors
-        for sector_no, context in self.read_sectors:
-            reads[sector_no].append(context)
-            if context and not allocated[sector_no]:
+        claimed = multiple = 0
+        for start, count, context in self.claims:
+            mask = AllocationMap.mask(start, count)
+            # unallocated sectors
+            unallocated = self.alloc_map.unused(mask)
+            for sector_no in AllocationMap.sectors(unallocated):
                 self.console.warn(f'{context}: Used sector {sector_no} not allocated')
+            if unallocated:
                 if file_ := self.catalog.get(context):
                     file_.fd.error = True
+                self.alloc_map.set(start, count)  # protect sectors from being reallocated
+            multiple |= claimed & mask
+            claimed |= mask
         # sectors allocated to multiple files
-        for sector_no, files in reads.items():
-            if len(files) <= 1:
-                continue
+        for sector_no in AllocationMap.sectors(multiple):
+            files = [context for start, count, context in self.claims if start <= sector_no < start + count]
             self.console.warn(f"Sector {sector_no} claimed by multiple files: {'/'.join(files)}")
             for name in files:
                 if file_ := self.catalog.get(name):
                     file_.fd.error = True
 
+    def _count_used_sectors(self):
+        """return number of sectors marked as used in allocation bitmap"""
+        return self.alloc_map.count(0, Util.used(self.total_sectors, 8) * 8)
+
     def _rebuild_disk(self):
         """rebuild disk metadata after changes to file catalog"""
+        for file_ in self.catalog.values():
+            file_.load()  # contents must be read before sectors get overwritten
         required_sectors = sum(self.catalog[n].fd.total_sectors for n in self.catalog)
         # preferred start at sector >22
         first_free = next_free_sector = min(max(2 + len(self.catalog), 0x22), self.total_sectors - required_sectors)
@@ -246,25 +349,109 @@ class Disk:
             file_.fd.clusters = (bytes((start & 0xff, start >> 8 | (offset & 0xf) << 4, offset >> 4)) +
                                  bytes(Disk.BYTES_PER_SECTOR - 0x1c - 3))
             self.set_sector(index, file_.fd.get_disk_or_v9t9_header())
+            self.fdr_sectors[idx] = index
             # update FDR index in sector 1
             sector_1 += Util.chrn(index)
             next_free_sector += file_.fd.total_sectors
             index += 1
         sector_1 += bytes(Disk.BYTES_PER_SECTOR - len(sector_1))
         self.set_sector(1, sector_1)
-        # update allocation bitmap in sector 0 (used: 0..i-1, ff..nf-1)
+        # update allocation bitmap in sector 0 (used: 0..i-1, ff..nf-1, non-existing sectors)
         assert 0 < index <= first_free <= next_free_sector
-        mask = int('1' * (next_free_sector - first_free) +
-                   '0' * (first_free - index) + '1' * index, 2)  # bitmap as bits, parsed into (very large) int
-        bytes_ = []
-        for i in range(self.total_sectors // 8):
-            bytes_.append(bytes((mask & 0xff,)))  # byte-ize int from the tail
-            mask >>= 8
-        self.alloc_bitmap = b''.join(bytes_) + b'\xff' * (Disk.BYTES_PER_SECTOR - Disk.ALLOC_BITMAP - len(bytes_))
+        self.alloc_map = AllocationMap(size=Disk.BYTES_PER_SECTOR - Disk.ALLOC_BITMAP)
+        self.alloc_map.set(0, index)
+        self.alloc_map.set(first_free, next_free_sector - first_free)
+        self.alloc_map.set(Util.trunc(self.total_sectors, 8), self.alloc_map.size * 8)
         sector_0 = self.get_sector(0)
-        self.set_sector(0, sector_0[:self.ALLOC_BITMAP] + self.alloc_bitmap)
+        self.set_sector(0, sector_0[:self.ALLOC_BITMAP] + self.alloc_map.to_bytes())
+        self.used_sectors = self._count_used_sectors()
         self.modified = True
 
+    def _set_allocation(self, extents, used):
+        """mark sector ranges (start sector, sector count) as used or free in allocation bitmap"""
+        for start, count in extents:
+            self.alloc_map.set(start, count, used)
+
+    def _get_free_extents(self, alloc_map=None):
+        """return unallocated sector ranges as list of (start sector, sector count)"""
+        return (alloc_map or self.alloc_map).free_extents(2, self.total_sectors)
+
+    def _allocate(self, count, alloc_map):
+        """allocate sectors for file contents in given bitmap, return list of (start sector, sector count),
+           or None if file would need more clusters than an FDR holds
+        """
+        if count == 0:
+            return []
+        # prefer data area, then sectors reserved for FDRs
+        data_area, fdr_area = [], []
+        for start, n in self._get_free_extents(alloc_map):
+            if start + n <= Disk.FIRST_DATA_SECTOR:
+                fdr_area.append((start, n))
+            elif start < Disk.FIRST_DATA_SECTOR:
+                fdr_area.append((start, Disk.FIRST_DATA_SECTOR - start))
+                data_area.append((Disk.FIRST_DATA_SECTOR, start + n - Disk.FIRST_DATA_SECTOR))
+            else:
+                data_area.append((start, n))
+        free_extents = data_area + fdr_area
+        # use first contiguous free range, otherwise fragment file
+        extents = next(([(start, count)] for start, n in free_extents if n >= count), None)
+        if extents is None:
+            extents = []
+            for start, n in free_extents:
+                extents.append((start, min(n, count)))
+                count -= min(n, count)
+                if count == 0:
+                    break
+            else:
+                raise ContainerError(f'Disk full, lacking {count} sectors')
+            if len(extents) > Disk.MAX_CLUSTERS:
+                return None
+        for start, n in extents:
+            alloc_map.set(start, n)
+        return extents
+
+    def _allocate_fdr(self, alloc_map):
+        """allocate lowest free sector for file descriptor in given bitmap"""
+        free_extents = self._get_free_extents(alloc_map)
+        if not free_extents:
+            raise ContainerError('Disk full, lacking 1 sectors')
+        sector_no = free_extents[0][0]
+        alloc_map.set(sector_no, 1)
+        return sector_no
+
+    def _write_file(self, file_, extents, fdr_sector):
+        """write file contents and file descriptor into allocated sectors"""
+        data = file_.data
+        i = 0
+        for start, count in extents:
+            for sector_no in range(start, start + count):
+                sector = data[Disk.BYTES_PER_SECTOR * i:Disk.BYTES_PER_SECTOR * (i + 1)]
+                self.set_sector(sector_no, sector + bytes(Disk.BYTES_PER_SECTOR - len(sector)))
+                i += 1
+        file_.fd.clusters = Disk.encode_clusters(extents)
+        self.set_sector(fdr_sector, file_.fd.get_disk_or_v9t9_header())
+        self.catalog[file_.fd.name] = file_
+        self.fdr_sectors[file_.fd.name] = fdr_sector
+
+    def _release_file(self, name):
+        """remove file from catalog, free and blank its sectors"""
+        file_ = self.catalog.pop(name)
+        extents = Disk.decode_clusters(file_.fd.clusters) + [(self.fdr_sectors.pop(name), 1)]
+        for start, count in extents:
+            for sector_no in range(start, min(start + count, self.total_sectors)):
+                self.set_sector(sector_no, Disk.BLANK_BYTE * Disk.BYTES_PER_SECTOR)
+        self._set_allocation(extents, False)
+
+    def _update_metadata(self):
+        """write FDR index and allocation bitmap after changes to file catalog"""
+        if len(self.catalog) > Disk.MAX_FILES:
+            raise ContainerError(f'Too many files, at most {Disk.MAX_FILES} files per disk')
+        sector_1 = b''.join(Util.chrn(self.fdr_sectors[name]) for name in sorted(self.catalog))
+        self.set_sector(1, sector_1 + bytes(Disk.BYTES_PER_SECTOR - len(sector_1)))
+        sector_0 = self.get_sector(0)
+        self.set_sector(0, sector_0[:Disk.ALLOC_BITMAP] + self.alloc_map.to_bytes())
+        self.used_sectors = self._count_used_sectors()
+
     @staticmethod
     def is_formatted(image):
         """is disk formatted?"""
@@ -284,9 +471,10 @@ class Disk:
             if tracks:
                 self.tracks_per_side = tracks
             self.sectors_per_track = sectors_per_track
-        self.image = (self.image[:Disk.SECTORS_PER_TRACK] + bytes((self.sectors_per_track,)) +
-                      self.image[Disk.DSK_ID:Disk.TRACKS_PER_SIDE] +
-                      bytes((self.tracks_per_side, self.sides, self.density)) + self.image[Disk.RESERVED:])
+        sector_0 = bytearray(self.get_sector(0))
+        sector_0[Disk.SECTORS_PER_TRACK] = self.sectors_per_track
+        sector_0[Disk.TRACKS_PER_SIDE:Disk.RESERVED] = bytes((self.tracks_per_side, self.sides, self.density))
+        self.set_sector(0, sector_0)
         self.console.clear_warnings(Warnings.GEOMETRY)
         self._check_geometry()
         self.modified = True
@@ -297,13 +485,17 @@ class Disk:
             raise ContainerError(f'Invalid disk size, expected between 2 and {Disk.MAX_SECTORS} sectors')
         if self.total_sectors % 8 != 0 or new_size % 8 != 0:
             raise ContainerError('Old and new disk size must be multiple of 8 sectors')
-        old_size = self.total_sectors
+        self._unmap()
         self.total_sectors = new_size
         self.used_sectors = 0
         self._rebuild_disk()
-        self.image = (self.image[:Disk.DISK_NAME_LEN] + Util.chrn(new_size) +
-                      self.image[Disk.SECTORS_PER_TRACK:new_size * self.BYTES_PER_SECTOR] +
-                      self.BLANK_BYTE * ((new_size - old_size) * self.BYTES_PER_SECTOR))
+        sector_0 = bytearray(self.get_sector(0))
+        sector_0[Disk.TOTAL_SECTORS:Disk.TOTAL_SECTORS_END] = Util.chrn(new_size)
+        self.set_sector(0, sector_0)
+        # truncate or extend sector store to new size
+        size = new_size * Disk.BYTES_PER_SECTOR
+        del self.image[size:]
+        self.image.extend(Disk.BLANK_BYTE * (size - len(self.image)))
 
     @staticmethod
     def trim_sectors(image):
@@ -313,9 +505,8 @@ class Disk:
 
     def fix_disk(self):
         """rebuild disk with non-erroneous files"""
-        for name, file_ in self.catalog.items():
-            if file_.fd.error:
-                del self.catalog[name]
+        for name in [name for name, file_ in self.catalog.items() if file_.fd.error]:
+            del self.catalog[name]
         self._rebuild_disk()
 
     def rename_disk(self, name):
@@ -323,20 +514,29 @@ class Disk:
         self.name = name
         if len(self.name.encode()) > Disk.DISK_NAME_LEN:
             raise ContainerError('Encoded name is too long')
-        self.image = self.name.encode() + b' ' * (Disk.DISK_NAME_LEN - len(self.name)) + self.image[Disk.DISK_NAME_LEN:]
-        self.modified = True
+        sector_0 = bytearray(self.get_sector(0))
+        sector_0[:Disk.DISK_NAME_LEN] = b'%-10b' % self.name.encode()
+        self.set_sector(0, sector_0)
+
+    def _check_sectors(self, start, count=1, context=None):
+        """check sector range and record access for allocation check, return number of existing sectors"""
+        if start == 0:
+            valid = count  # always present
+        else:
+            existing = max(self.total_sectors, len(self.image) // Disk.BYTES_PER_SECTOR)
+            valid = max(min(start + count, existing) - start, 0)
+            if valid and start + valid > self.total_sectors:
+                self.console.warn('Total sectors not set properly')
+        if context and valid:
+            self.claims.append((start, valid, context))
+        return valid
 
     def get_sector(self, sector_no, context=None):
         """retrieve sector from image"""
-        if sector_no > 0 and sector_no >= self.total_sectors:
-            if sector_no < len(self.image) // Disk.BYTES_PER_SECTOR:
-                self.console.warn('Total sectors not set properly')
-            else:
-                raise IndexError('Invalid sector number')
-        if context:
-            self.read_sectors.append((sector_no, context))
+        if not self._check_sectors(sector_no, 1, context):
+            raise IndexError('Invalid sector number')
         offset = sector_no * Disk.BYTES_PER_SECTOR
-        return self.image[offset:offset + Disk.BYTES_PER_SECTOR]
+        return bytes(self.image[offset:offset + Disk.BYTES_PER_SECTOR])
 
     def set_sector(self, sector_no, data):
         """write sector to image"""
@@ -346,9 +546,37 @@ class Disk:
             raise ValueError(f'Invalid data for sector {sector_no:d}: found {len(data):d} bytes, ' +
                              f'expected {Disk.BYTES_PER_SECTOR:d}')
         offset = sector_no * Disk.BYTES_PER_SECTOR
-        self.image = self.image[:offset] + data + self.image[offset + Disk.BYTES_PER_SECTOR:]
+        if offset + Disk.BYTES_PER_SECTOR > len(self.image):
+            self._unmap()
+        if offset > len(self.image):
+            self.image.extend(Disk.BLANK_BYTE * (offset - len(self.image)))  # truncated image
+        self.image[offset:offset + Disk.BYTES_PER_SECTOR] = data  # in-place update
+        self.dirty_sectors.add(sector_no)
         self.modified = True
 
+    def _unmap(self):
+        """replace mapped or provided image by in-memory copy that can change size"""
+        if not isinstance(self.image, bytearray):
+            self.image = bytearray(self.image[:])
+
+    def is_mapped(self):
+        """is disk image mapped from its image file?"""
+        return isinstance(self.image, mmap.mmap)
+
+    def is_provided(self):
+        """is disk image read from other sector store, such as HFE image?"""
+        return not isinstance(self.image, (bytearray, mmap.mmap))
+
+    def write_sectors(self, filename):
+        """write modified sectors of mapped image back to image file"""
+        assert self.is_mapped()
+        with open(filename, 'r+b') as f:
+            for sector_no in sorted(self.dirty_sectors):
+                offset = sector_no * Disk.BYTES_PER_SECTOR
+                f.seek(offset)
+                f.write(self.image[offset:offset + Disk.BYTES_PER_SECTOR])
+        self.dirty_sectors.clear()
+
     def glob_files(self, patterns):
         """return listing of filenames matching glob pattern"""
         return Util.glob(self, patterns)
@@ -361,34 +589,76 @@ class Disk:
             raise ContainerError(f'File {name} not found on disk')
 
     def add_files(self, files):
-        """add or update files"""
-        for file in files:
-            self.catalog[file.fd.name] = file
-        self._rebuild_disk()
+        """add or update files, only sectors of new files are written"""
+        files = {file.fd.name: file for file in files}  # last file of same name wins
+        for file in files.values():
+            file.load()  # contents must be read before sectors get released
+        # check free space, including sectors of files to be replaced
+        required = sum(file.fd.total_sectors + 1 for file in files.values())
+        free = (self.total_sectors - 2 - self.alloc_map.count(2, self.total_sectors) +
+                sum(self.catalog[name].fd.total_sectors + 1 for name in files if name in self.catalog))
+        if required > free:
+            raise ContainerError(f'Disk full, lacking {required - free} sectors')
+        if len(set(self.catalog) | set(files)) > Disk.MAX_FILES:
+            raise ContainerError(f'Too many files, at most {Disk.MAX_FILES} files per disk')
+        # allocate on copy of bitmap first, so that failures leave disk unchanged
+        alloc_map = self.alloc_map.copy()
+        for name in files:
+            if name in self.catalog:
+                alloc_map.set(self.fdr_sectors[name], 1, False)
+                for start, count in Disk.decode_clusters(self.catalog[name].fd.clusters):
+                    alloc_map.set(start, count, False)
+        allocations = []
+        for file in files.values():
+            extents = self._allocate(file.fd.total_sectors, alloc_map)
+            if extents is None:
+                # free sectors too fragmented, compact disk instead
+                self._compact_files(files)
+                return
+            allocations.append((file, extents, self._allocate_fdr(alloc_map)))
+        for name in files:
+            if name in self.catalog:
+                self._release_file(name)
+        self.alloc_map = alloc_map
+        for file, extents, fdr_sector in allocations:
+            self._write_file(file, extents, fdr_sector)
+        self._update_metadata()
+
+    def _compact_files(self, files):
+        """add or update files by rewriting all files into contiguous clusters"""
+        catalog = dict(self.catalog)
+        self.catalog.update(files)
+        try:
+            self._rebuild_disk()
+        except ContainerError:
+            self.catalog = catalog  # disk full, no sectors written yet
+            raise
 
     def remove_files(self, names):
         """remove files from image"""
         for name in names:
-            try:
-                del self.catalog[name]
-            except KeyError:
+            if name not in self.catalog:
                 raise ContainerError(f'File {name} not found')
-        self._rebuild_disk()
+        for name in names:
+            self._release_file(name)
+        self._update_metadata()
 
     def rename_files(self, names):
-        """rename files in image"""
-        # rename dry-run
+        """rename files in image, only affected FDRs are rewritten"""
         for old, new in names:
             try:
-                self.catalog[old].fd.name = new
+                file = self.catalog[old]
             except KeyError:
                 raise ContainerError(f'File {old} not found')
-            try:
-                self.catalog[new] = self.catalog[old]
-            except KeyError:
-                raise ContainerError(f'File {new} not found')
-            del self.catalog[old]
-        self._rebuild_disk()
+            if new == old:
+                continue
+            if new in self.catalog:
+                self._release_file(new)  # replace existing file
+            file.fd.name = new
+            self.catalog[new] = self.catalog.pop(old)
+            self.fdr_sectors[new] = self.fdr_sectors.pop(old)
+            self.set_sector(self.fdr_sectors[new], file.fd.get_disk_or_v9t9_header())
+        self._update_metadata()
 
     def protect_files(self, names):
         """toggle protection for given files"""
@@ -398,7 +668,7 @@ class Disk:
             except KeyError:
                 raise ContainerError(f'File {name} not found')
             file.fd.toggle_protection()
-        self._rebuild_disk()
+            self.set_sector(self.fdr_sectors[name], file.fd.get_disk_or_v9t9_header())
 
     def get_tifiles_file(self, name):
         """get file in TIFILES format from disk catalog"""
@@ -417,7 +687,7 @@ class Disk:
 
     def get_image(self):
         """return disk image"""
-        return self.image
+        return bytes(self.image)
 
     def get_info(self):
         """return information about disk image"""
@@ -434,7 +704,22 @@ class Disk:
 
     def get_catalog(self):
         """return formatted disk catalog"""
-        return ''.join(self.catalog[n].fd.get_info() for n in sorted(self.catalog))
+        return ''.join(self.catalog[n].get_info() for n in sorted(self.catalog))
+
+
+class RDisk(RContainer):
+    """output container for mapped disk image, only writes modified sectors back to original image file"""
+
+    def __init__(self, disk, name):
+        super().__init__(None, name, iscontainer=True)
+        self.disk = disk
+
+    def write(self, output=None, encoding=None):
+        if output or self.output or not self.disk.is_mapped():
+            self.data = self.disk.get_image()  # write complete image
+            super().write(output=output, encoding=encoding)
+        else:
+            self.disk.write_sectors(self.name)
 
 
 # Archives
@@ -465,54 +750,74 @@ class Archive:
         self.lzw = LZW()
         if cdata is None:
             self.archive = bytes(252) + b'END!'  # new, empty archive
-            self.cdata = self.lzw.compress(self.archive)
+            self._cdata = self.lzw.compress(self.archive)
+            self.chunks = None
+            self.size = len(self.archive)
             self.modified = True
+            self.dirty = False
             return
-        self.cdata = cdata
-        self.archive = self.lzw.decompress(cdata)
+        self._cdata = cdata
+        self.archive = bytearray()  # uncompressed archive, decompressed on demand
+        self.chunks = self.lzw.decompress_chunks(cdata)
         self.modified = False
-        # get files stored in archive
-        directory = None
-        for s in range(Util.used(len(self.archive), 256)):
-            offset = (s + 1) * 256
+        self.dirty = False  # catalog changed, but archive not rebuilt yet
+        # get files stored in archive, decompressing directory sectors only
+        offset = 256
+        while self._decompress(offset):
             if self.archive[offset - 4:offset] == b'END!':  # end of directory marker
-                directory = self.archive[:offset]
                 break
-        if not directory:
+            offset += 256
+        else:
             raise ContainerError('Malformed archive')
+        directory = self.archive[:offset]
         i = 0  # directory index
         j = len(directory)  # data index
         while i < len(directory):
-            if self.archive[i] == 0:
+            if directory[i] == 0:
                 # move to next sector
                 i = Util.trunc(i + 256, 256)
                 continue
             try:
                 # get catalog entry
-                name = self.archive[i:i + 10].decode().rstrip()
-                sectors = Util.ordn(self.archive[i + 12:i + 14])
+                name = directory[i:i + 10].decode().rstrip()
+                sectors = Util.ordn(directory[i + 12:i + 14])
                 fd = FileDescriptor(name=name,
-                                    flags=self.archive[i + 10],
-                                    records_per_sector=self.archive[i + 11],
+                                    flags=directory[i + 10],
+                                    records_per_sector=directory[i + 11],
                                     total_sectors=sectors,
-                                    eof_offset=self.archive[i + 14],
-                                    record_len=self.archive[i + 15],
-                                    lv3_records=Util.rordw(self.archive[i + 16:i + 18]))
-                # get data for catalog entry
-                data = self.archive[j:j + sectors * 256]
+                                    eof_offset=directory[i + 14],
+                                    record_len=directory[i + 15],
+                                    lv3_records=Util.rordw(directory[i + 16:i + 18]))
+                # data for catalog entry is decompressed when file is loaded
                 if name in self.catalog:
                     self.console.warn('Duplicate name in archive: ' + name)
-                self.catalog[name] = File(fd=fd, data=data)
+                self.catalog[name] = File(fd=fd, loader=partial(self._read_data, j, sectors * 256))
                 # next file in archive
                 i += 18
                 j += sectors * 256
             except UnicodeDecodeError:
-                self.console.warn(b'Invalid filename in archive: ' + self.archive[i:i + 10])
+                self.console.warn(b'Invalid filename in archive: ' + bytes(directory[i:i + 10]))
+        self.size = j  # size of uncompressed archive
+
+    def _decompress(self, size):
+        """decompress archive up to given size, return if archive is at least that large"""
+        while len(self.archive) < size and self.chunks is not None:
+            try:
+                self.archive += next(self.chunks)
+            except StopIteration:
+                self.chunks = None
+        return len(self.archive) >= size
+
+    def _read_data(self, offset, size):
+        """read uncompressed data of file stored in archive"""
+        self._decompress(offset + size)
+        return bytes(self.archive[offset:offset + size])
 
     def _rebuild_archive(self):
         """rebuild archive and compressed archive"""
         file_recs = []
         names = sorted(self.catalog.keys())
+        data = b''.join(self.catalog[name].get_data() for name in names)  # also loads deferred contents
         for name in names:
             file = self.catalog[name]
             rec_count = file.fd.total_sectors if file.fd.flags & 0x80 else file.fd.lv3_records  # quirk
@@ -525,11 +830,23 @@ class Archive:
                                     rec_count & 0xff, rec_count >> 8)))
         entries = b''.join(file_recs)
         directory = entries + bytes(Util.pad(len(entries) + 4, 256)) + b'END!'
-        data = b''.join(self.catalog[name].get_data() for name in names)
         assert len(data) % Disk.BYTES_PER_SECTOR == 0
         self.archive = directory + data
-        self.cdata = self.lzw.compress(self.archive)
-        self.modified = True
+        self.chunks = None
+        self.size = len(self.archive)
+        self._cdata = self.lzw.compress(self.archive)
+        self.dirty = False
+
+    @property
+    def cdata(self):
+        """compressed archive, rebuilt on demand after changes to catalog"""
+        if self.dirty:
+            self._rebuild_archive()
+        return self._cdata
+
+    def _invalidate(self):
+        """mark archive for rebuild"""
+        self.dirty = self.modified = True
 
     def glob_files(self, patterns):
         """glob files"""
@@ -546,7 +863,7 @@ class Archive:
         """add file to archive"""
         for file in files:
             self.catalog[file.fd.name] = file
-        self._rebuild_archive()
+        self._invalidate()
 
     def remove_files(self, filenames):
         """delete entries from archive"""
@@ -555,7 +872,7 @@ class Archive:
                 del self.catalog[name]
             except KeyError:
                 raise ContainerError(f'File {name} not found in archive')
-        self._rebuild_archive()
+        self._invalidate()
 
     def rename_files(self, renames):
         """rename entries in archive"""
@@ -570,7 +887,7 @@ class Archive:
             except KeyError:
                 raise ContainerError(f'File {new} not found in archive')
             del self.catalog[old]
-        self._rebuild_archive()
+        self._invalidate()
 
     def protect_files(self, filenames):
         """toggle protection status of files in archive"""
@@ -580,7 +897,7 @@ class Archive:
             except KeyError:
                 raise ContainerError(f'File {name} not found in archive')
             file.fd.toggle_protection()
-        self._rebuild_archive()
+        self._invalidate()
 
     def get_tifiles_file(self, name):
         """get file in TIFILES format from disk catalog"""
@@ -599,11 +916,9 @@ class Archive:
 
     def get_info(self):
         """return information about archive"""
+        csize = len(self.cdata)  # also rebuilds archive
         return 'Archive: {:10s}   Size (c/u): {} B / {} B   Ratio: {:.1f}%\n'.format(
-            self.name,
-            len(self.cdata),
-            len(self.archive),
-            100 * len(self.cdata) / len(self.archive))
+            self.name, csize, self.size, 100 * csize / self.size)
 
     def get_catalog(self):
         """return formatted archive catalog"""
@@ -617,49 +932,46 @@ class Archive:
 
 
 class Bitstream:
-    """translates sequence of bits into bytes, and vice versa"""
+    """translates sequence of bits into bytes, and vice versa, using 24-bit words"""
 
     def __init__(self, data=None, width=9):
         if data is None:
-            self.data = b''  # for writing
+            self.data = bytearray()  # for writing
             self.datalen = 0
         else:
-            self.data = data + bytes(2)  # padding to read final bits correctly
+            self.data = bytes(data) + bytes(2)  # padding to read final bits correctly
             self.datalen = len(data)
-        self.dataval = []  # for writing
+        self.bits = 0  # pending bits for writing
+        self.bitcount = 0
         self.width = width
         self.initial_width = width
         self.currpos = 0  # in bits
 
     def read(self):
         """read value of next bits of current width"""
-        if self.currpos + self.width > self.datalen * 8:
+        pos, width = self.currpos, self.width
+        if pos + width > self.datalen * 8:
             raise StopIteration
-        byte_index = self.currpos // 8
-        value = Util.ordn(self.data[byte_index:byte_index + 3])
-        value = (value << (self.currpos % 8)) & 0xffffff
-        value >>= (24 - self.width)
-        self.currpos += self.width
-        return value
+        i = pos >> 3
+        word = self.data[i] << 16 | self.data[i + 1] << 8 | self.data[i + 2]
+        self.currpos = pos + width
+        return (word >> (24 - (pos & 7) - width)) & ((1 << width) - 1)
 
     def write(self, value):
         """write value to stream"""
-        bit_offset = self.currpos % 8
-        value = (value << (24 - self.width)) >> bit_offset
-        n = self.width
-        if bit_offset != 0:
-            self.dataval[-1] |= value >> 16
-            value = (value << 8) & 0xffffff
-            n -= 8 - bit_offset
-        while n > 0:
-            self.dataval.append(value >> 16)
-            value = (value << 8) & 0xffffff
-            n -= 8
+        bits = self.bits << self.width | value
+        count = self.bitcount + self.width
+        if count >= 16:
+            count -= 16
+            self.data += (bits >> count).to_bytes(2, 'big')  # keeps less than 16 bits pending
+            bits &= (1 << count) - 1
+        self.bits, self.bitcount = bits, count
         self.currpos += self.width
 
     def array(self):
         """return data written to Bitstream"""
-        return bytes(self.dataval)
+        size = Util.used(self.bitcount, 8)
+        return bytes(self.data) + (self.bits << (size * 8 - self.bitcount)).to_bytes(size, 'big')  # pad final byte
 
     def putback(self):
         """unread last value"""
@@ -676,89 +988,101 @@ class LZW:
     RESET = 256  # extensions for ARK archives
     DONE = 257
     NEXT = 258
+    MAX_WIDTH = 12
 
     @staticmethod
     def compress(data):
         """actually compress data
-           self.patterns: {int array: int}
+           patterns: {prefix code << 8 | byte: code}, single bytes are their own codes
         """
-        patterns = {(i,): i for i in range(LZW.NEXT)}
         bstream = Bitstream()
         bstream.write(LZW.RESET)
-        next_code = LZW.NEXT
-        w = ()
-        i = 0
-        while i < len(data):
-            b = data[i]
-            p = w + (b,)
-            if p in patterns:
-                w = p
-            else:
-                bstream.write(patterns[w])
+        if data:
+            patterns = {}
+            next_code = LZW.NEXT
+            w = data[0]  # code of current prefix
+            for b in memoryview(data)[1:]:
+                key = w << 8 | b
+                code = patterns.get(key)
+                if code is not None:
+                    w = code
+                    continue
+                bstream.write(w)
                 if next_code >> bstream.width:
-                    if bstream.width == 12:
+                    if bstream.width == LZW.MAX_WIDTH:
                         bstream.write(LZW.RESET)
                         bstream.reset()
-                        patterns = {(i,): i for i in range(LZW.NEXT)}
+                        patterns = {}
                         next_code = LZW.NEXT
-                        w = ()
+                        w = b  # restart with current byte
                         continue
-                    else:
-                        bstream.width += 1
-                patterns[p] = next_code
+                    bstream.width += 1
+                patterns[key] = next_code
                 next_code += 1
-                w = (b,)
-            i += 1
-        bstream.write(patterns[w])
+                w = b
+            bstream.write(w)
         bstream.write(LZW.DONE)
         return bstream.array()
 
     @staticmethod
     def decompress(cdata):
-        """actually decompress data
-           self.patterns: {int: int array}
-           The int array only containes values 0 <= n <= 255
+        """actually decompress data"""
+        return b''.join(LZW.decompress_chunks(cdata))
+
+    @staticmethod
+    def decompress_chunks(cdata, chunk_size=4096):
+        """decompress data incrementally, yielding uncompressed data in chunks of about chunk_size bytes
+           patterns: [bytes], indexed by code
         """
-        patterns = {i: (i,) for i in range(LZW.NEXT)}
+        initial_patterns = [bytes((i,)) for i in range(LZW.RESET)] + [b'', b'']  # RESET and DONE have no pattern
+        patterns = list(initial_patterns)
         bstream = Bitstream(cdata)  # compressed data consists of up to 12-bit values
-        next_code = LZW.NEXT
-        w = ()
-        data = []  # uncompressed data consists of 8-bit values
+        read = bstream.read
+        limit = 1 << bstream.width  # first code requiring wider values
+        w = None
+        data = bytearray()  # uncompressed data not yet yielded
         while True:
+            if len(data) >= chunk_size:
+                yield bytes(data)
+                data.clear()
             try:
-                n = bstream.read()
+                n = read()
                 if n == LZW.RESET:
                     bstream.reset()
-                    patterns = {i: (i,) for i in range(LZW.NEXT)}
-                    next_code = LZW.NEXT
-                    w = ()
+                    limit = 1 << bstream.width
+                    patterns = list(initial_patterns)
+                    w = None
                     continue
                 elif n == LZW.DONE:
                     break
-                if not w:
-                    w = (n,)
-                    data.extend(patterns[n])
+                if w is None:
+                    if n >= LZW.RESET:
+                        raise ContainerError('Invalid archive')
+                    w = patterns[n]
+                    data += w
                     continue
-                if n > next_code:
-                    raise ContainerError('Invalid archive')
-                try:
+                next_code = len(patterns)
+                if n < next_code:
                     e = patterns[n]
-                except KeyError:
-                    e = w + (w[0],)
-                data.extend(e)
-                patterns[next_code] = w + (e[0],)
-                next_code += 1
+                elif n == next_code:
+                    e = w + w[:1]
+                else:
+                    raise ContainerError('Invalid archive')
+                data += e
+                patterns.append(w + e[:1])
                 w = e
-                if next_code >> bstream.width:
-                    if bstream.width == 12:
+                if next_code + 1 == limit:
+                    if bstream.width == LZW.MAX_WIDTH:
                         continue  # keep width and continue
-                    if bstream.read() == LZW.DONE:
+                    if read() == LZW.DONE:
                         break
                     bstream.putback()
                     bstream.width += 1
+                    limit <<= 1
             except StopIteration:
                 raise ContainerError('Incomplete archive ended without STOP code')
-        return bytes(data)
+        if data:
+            yield bytes(data)
 
 
 # Files
@@ -1002,17 +1326,45 @@ class File:
 
     HEADER_LEN = 0x80
 
-    def __init__(self, fd=None, records=None, data=None, console=None):
+    def __init__(self, fd=None, records=None, data=None, console=None, loader=None):
         self.console = console or Xdm99Console()
         self.fd = fd
-        self.records = records
-        self.data = data
+        self._records = records  # unpacked from data on demand
+        self._data = data
+        self._loader = loader  # returns file contents on first access
         self._dirty_data = True
-        if fd is None or data is None:
-            self.fd = self.data = None
-        else:
-            if records is None:
-                self.records = self.unpack_records(fd, data)
+        if fd is None or (data is None and loader is None):
+            self.fd = self._data = None
+        elif records is None and loader is None:
+            fd.lv3_records = File.count_records(fd, data)
+
+    @property
+    def data(self):
+        self.load()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    @property
+    def records(self):
+        self.load()
+        if self._records is None:
+            self._records = File.unpack_records(self.fd, self._data)
+        return self._records
+
+    @records.setter
+    def records(self, records):
+        self._records = records
+
+    def load(self):
+        """read deferred file contents, also updates record information of FDR"""
+        if self._loader is None:
+            return
+        self._data = self._loader()
+        self._loader = None
+        self.fd.lv3_records = File.count_records(self.fd, self._data)
 
     @staticmethod
     def create_new(name, format_, data, console=None):
@@ -1020,7 +1372,7 @@ class File:
         fd = FileDescriptor.create(name, format_)
         records = File.split_contents(fd, data)
         repacked_data = File.pack_records(fd, records, console=console)  # repack, also sets file size information
-        return File(fd=fd, records=records, data=repacked_data, console=console)
+        return File(fd=fd, data=repacked_data, console=console)
 
     @staticmethod
     def create_from_tif_image(image, hostfn=None, console=None):
@@ -1029,8 +1381,7 @@ class File:
             raise FileError('Invalid TIFILES image')
         fd = FileDescriptor.create_from_tif_header(image[:File.HEADER_LEN], hostfn=hostfn)
         data = image[File.HEADER_LEN:]
-        records = File.unpack_records(fd, data)
-        return File(fd=fd, data=data, records=records, console=console)
+        return File(fd=fd, data=data, console=console)
 
     @staticmethod
     def create_from_v9t9_image(image, console=None):
@@ -1039,121 +1390,169 @@ class File:
             raise FileError('Invalid v9t9 image')
         fd = FileDescriptor.create_from_fdr_sector(image[:File.HEADER_LEN])
         data = image[File.HEADER_LEN:]
-        records = File.unpack_records(fd, data)
-        return File(fd=fd, data=data, records=records, console=console)
+        return File(fd=fd, data=data, console=console)
 
     @staticmethod
     def split_contents(fd, data):
-        """split blob into records"""
+        """split blob into records, returning data for PROGRAM files and record iterator otherwise"""
         if fd.type == FileDescriptor.PROGRAM:
             return data
-        elif fd.mode == FileDescriptor.FIXED:
+        view = memoryview(data)
+        if fd.mode == FileDescriptor.FIXED:
             reclen = fd.record_len
-            return [data[i:i + reclen] for i in range(0, len(data), reclen)]
+            return (view[i:i + reclen] for i in range(0, len(view), reclen))
         elif fd.type == FileDescriptor.DISPLAY:
-            return data.splitlines()
+            return File._split_lines(data, view)
+        else:
+            return File._split_length_prefixed(view)
+
+    @staticmethod
+    def _split_lines(data, view):
+        """iterate over lines of blob, same as splitlines()"""
+        pos = 0
+        if b'\r' in data:
+            for m in re.finditer(rb'\r\n|\r|\n', data):
+                yield view[pos:m.start()]
+                pos = m.end()
         else:
-            records = []
-            i = 0
-            while i < len(data):
-                reclen = data[i] + 1
-                records.append(data[i + 1:i + reclen])  # remove record length
-                i += reclen
-            return records
+            find = data.find
+            while (end := find(b'\n', pos)) >= 0:
+                yield view[pos:end]
+                pos = end + 1
+        if pos < len(view):
+            yield view[pos:]
+
+    @staticmethod
+    def _split_length_prefixed(view):
+        """iterate over records prefixed by record length"""
+        i = 0
+        while i < len(view):
+            reclen = view[i] + 1
+            yield view[i + 1:i + reclen]  # remove record length
+            i += reclen
+
+    @staticmethod
+    def iter_records(fd, data):
+        """iterate over records of FIXED or VARIABLE file in sector image, yielding memoryviews of data"""
+        view = memoryview(data)
+        if fd.mode == FileDescriptor.FIXED:
+            records_per_sector = fd.records_per_sector or Disk.BYTES_PER_SECTOR
+            for i in range(fd.lv3_records):
+                sector, index = divmod(i, records_per_sector)
+                idx = sector * Disk.BYTES_PER_SECTOR + index * fd.record_len
+                yield view[idx:idx + fd.record_len]
+        else:  # VARIABLE
+            size = len(view)
+            for start in range(0, fd.total_sectors * Disk.BYTES_PER_SECTOR, Disk.BYTES_PER_SECTOR):
+                idx = start
+                while idx < size:
+                    record_len = view[idx]
+                    if record_len == 0xff:
+                        if idx == start:
+                            yield view[idx + 1:idx + 256]  # DIS/VAR255
+                        break  # end of sector
+                    yield view[idx + 1:idx + 1 + record_len]  # w/o record length
+                    idx += record_len + 1
+
+    @staticmethod
+    def _iter_fixed_sectors(fd, data):
+        """iterate over records of FIXED file in sector image, yielding all records of one sector at once"""
+        view = memoryview(data)
+        records_per_sector = fd.records_per_sector or Disk.BYTES_PER_SECTOR
+        for i in range(0, fd.lv3_records, records_per_sector):
+            idx = i // records_per_sector * Disk.BYTES_PER_SECTOR
+            yield view[idx:idx + min(records_per_sector, fd.lv3_records - i) * fd.record_len]
+
+    @staticmethod
+    def count_records(fd, data):
+        """return number of records in sector image"""
+        if fd.type == FileDescriptor.PROGRAM:
+            return 0
+        elif fd.mode == FileDescriptor.FIXED:
+            return fd.lv3_records
+        # VARIABLE: same traversal as iter_records, but without creating records
+        record_count = 0
+        size = len(data)
+        for start in range(0, fd.total_sectors * Disk.BYTES_PER_SECTOR, Disk.BYTES_PER_SECTOR):
+            idx = start
+            while idx < size:
+                record_len = data[idx]
+                if record_len == 0xff:
+                    record_count += idx == start  # DIS/VAR255
+                    break
+                record_count += 1
+                idx += record_len + 1
+        return record_count
 
     @staticmethod
     def unpack_records(fd, data):
         """extract list of records from sector image (-e)"""
-        records = []
         if fd.type == FileDescriptor.PROGRAM:
             records = data[:fd.eof_offset - Disk.BYTES_PER_SECTOR] if fd.eof_offset else data
-            fd.lv3_records = 0
-        elif fd.mode == FileDescriptor.FIXED:
-            records_per_sector = fd.records_per_sector or Disk.BYTES_PER_SECTOR
-            record_count = recs_added_to_sector = sector = 0
-            while record_count < fd.lv3_records:
-                if recs_added_to_sector >= records_per_sector:
-                    sector += 1
-                    recs_added_to_sector = 0
-                    continue
-                idx = sector * Disk.BYTES_PER_SECTOR + recs_added_to_sector * fd.record_len
-                records.append(data[idx:idx + fd.record_len])
-                record_count += 1
-                recs_added_to_sector += 1
-            fd.lv3_records = record_count
-        else:  # VARIABLE
-            record_count = offset_in_sector = sector = 0
-            while sector < fd.total_sectors:
-                idx = sector * Disk.BYTES_PER_SECTOR + offset_in_sector
-                record_len = data[idx] if idx < len(data) else -1
-                if (record_len == 0xff and offset_in_sector > 0) or record_len == -1:
-                    sector += 1
-                    offset_in_sector = 0
-                    continue
-                records.append(data[idx + 1:idx + 1 + record_len])  # store w/o record length
-                record_count += 1
-                if record_len == 0xff and offset_in_sector == 0:  # DIS/VAR255
-                    sector += 1
-                else:
-                    offset_in_sector += record_len + 1
-            fd.lv3_records = record_count
+        else:
+            records = [bytes(record) for record in File.iter_records(fd, data)]
+        fd.lv3_records = 0 if fd.type == FileDescriptor.PROGRAM else len(records)
         return records
 
     @staticmethod
     def pack_records(fd, records, console=None):
-        """create sector image from listing of records (-a), sets size information"""
-        parts = []
+        """create sector image from records, which may be any iterable (-a), sets size information"""
+        data = bytearray()
         record_count = sectors = offset_in_sector = 0
+        sector_size, record_len = Disk.BYTES_PER_SECTOR, fd.record_len
         if fd.type == FileDescriptor.PROGRAM:
-            data = records
-            fd.eof_offset = len(data) % Disk.BYTES_PER_SECTOR
-            sectors = Util.used(len(data), Disk.BYTES_PER_SECTOR)
+            data += records
+            fd.eof_offset = len(data) % sector_size
+            sectors = Util.used(len(data), sector_size)
             fd.lv3_records = 0
         elif fd.mode == FileDescriptor.FIXED:
+            pad_byte = b'\x00' if fd.type == FileDescriptor.INTERNAL else b' '
             for record in records:
-                if len(record) > fd.record_len:
+                if len(record) > record_len:
                     if console:
-                        console.warn(f'Record #{record_count} too long, truncating {len(record) - fd.record_len} bytes')
-                    record = record[:fd.record_len]
-                if offset_in_sector + fd.record_len > Disk.BYTES_PER_SECTOR:
-                    parts.append(bytes(Disk.BYTES_PER_SECTOR - offset_in_sector))
+                        console.warn(f'Record #{record_count} too long, truncating {len(record) - record_len} bytes')
+                    record = record[:record_len]
+                if offset_in_sector + record_len > sector_size:
+                    data += bytes(sector_size - offset_in_sector)
                     sectors += 1
                     offset_in_sector = 0
-                pad_len = fd.record_len - len(record)
-                parts.append(record + (bytes(pad_len) if fd.type == FileDescriptor.INTERNAL else b' ' * pad_len))
-                offset_in_sector += fd.record_len
+                data += record
+                data += pad_byte * (record_len - len(record))
+                offset_in_sector += record_len
                 record_count += 1
-            data = b''.join(parts)
-            fd.eof_offset = offset_in_sector % Disk.BYTES_PER_SECTOR
+            fd.eof_offset = offset_in_sector % sector_size
             sectors = sectors + 1
             fd.lv3_records = record_count
         else:  # VARIABLE
             for record in records:
-                if len(record) > fd.record_len:
+                if len(record) > record_len:
                     if console:
-                        console.warn(f'Record #{record_count} too long, truncating {len(record) - fd.record_len} bytes')
-                    record = record[:fd.record_len]
-                if offset_in_sector + 1 + len(record) + 1 > Disk.BYTES_PER_SECTOR and offset_in_sector > 0:
-                    parts.append(b'\xff' + bytes(Disk.BYTES_PER_SECTOR - offset_in_sector - 1))
+                        console.warn(f'Record #{record_count} too long, truncating {len(record) - record_len} bytes')
+                    record = record[:record_len]
+                length = len(record)
+                if offset_in_sector + length + 2 > sector_size and offset_in_sector > 0:
+                    data.append(0xff)
+                    data += bytes(sector_size - offset_in_sector - 1)
                     sectors += 1
                     offset_in_sector = 0
-                parts.append(bytes((len(record),)) + record)
+                data.append(length)
+                data += record
                 record_count += 1
-                if len(record) == Disk.BYTES_PER_SECTOR - 1:  # VAR255
+                if length == sector_size - 1:  # VAR255
                     sectors += 1
                     offset_in_sector = 0
                 else:
-                    offset_in_sector += len(record) + 1
+                    offset_in_sector += length + 1
             if offset_in_sector > 0:
-                parts.append(b'\xff')  # EOF marker
+                data.append(0xff)  # EOF marker
                 sectors += 1
-            data = b''.join(parts)
             fd.eof_offset = offset_in_sector
             fd.lv3_records = record_count
         fd.total_sectors = sectors
-        fd.size = (fd.total_sectors * Disk.BYTES_PER_SECTOR -
-                   Util.pad(fd.eof_offset, Disk.BYTES_PER_SECTOR))
-        return data + bytes(Util.pad(len(data), Disk.BYTES_PER_SECTOR))
+        fd.size = (fd.total_sectors * sector_size -
+                   Util.pad(fd.eof_offset, sector_size))
+        data += bytes(Util.pad(len(data), sector_size))
+        return bytes(data)
 
     def get_contents(self, encoding=None):
         """return file contents as serialized records
@@ -1161,18 +1560,30 @@ class File:
         """
         if self.fd.type == FileDescriptor.PROGRAM:
             return self.records
-        elif self.fd.mode == FileDescriptor.FIXED:
-            return b''.join(self.records)
+        records = self._records if self._records is not None else File.iter_records(self.fd, self.data)
+        if self.fd.mode == FileDescriptor.FIXED:
+            records_per_sector = self.fd.records_per_sector or Disk.BYTES_PER_SECTOR
+            if self._records is None and records_per_sector * self.fd.record_len <= Disk.BYTES_PER_SECTOR:
+                records = File._iter_fixed_sectors(self.fd, self.data)  # records are contiguous within sector
+            return b''.join(records)
         elif self.fd.type == FileDescriptor.DISPLAY:
             if encoding is None:
-                return b''.join(r + b'\n' for r in self.records)  # as binary
+                contents = bytearray()  # as binary
+                for record in records:
+                    contents += record
+                    contents += b'\n'
+                return bytes(contents)
             else:
                 try:
-                    return ''.join(r.encode(encoding) + '\n' for r in self.records)  # as text
+                    return ''.join(r.encode(encoding) + '\n' for r in records)  # as text
                 except UnicodeEncodeError:
                     raise ContainerError('Bad encoding')
         else:  # INTERNAL
-            return b''.join(bytes((len(r),)) + r for r in self.records)  # add length byte
+            contents = bytearray()
+            for record in records:
+                contents.append(len(record))  # add length byte
+                contents += record
+            return bytes(contents)
 
     def get_data(self):
         """return only data part as sectors"""
@@ -1183,15 +1594,18 @@ class File:
 
     def get_as_tifiles(self):
         """return file contents in TIFILES format"""
-        return self.fd.get_tifiles_header() + self.get_data()
+        data = self.get_data()
+        return self.fd.get_tifiles_header() + data
 
     def get_as_sdd99(self, loadtype=0):
         """return file contents in TIFILES format with SDD 99 extensions"""
-        return self.fd.get_tifiles_header(sdd99_loadtype=loadtype) + self.get_data()
+        data = self.get_data()
+        return self.fd.get_tifiles_header(sdd99_loadtype=loadtype) + data
 
     def get_as_v9t9(self):
         """return file contents in v9t9 format"""
-        return self.fd.get_disk_or_v9t9_header(v9t9=True) + self.get_data()
+        data = self.get_data()
+        return self.fd.get_disk_or_v9t9_header(v9t9=True) + data
 
     def _clean_data(self):
         """zero bytes in data which are not part of payload"""
@@ -1225,6 +1639,8 @@ class File:
 
     def get_info(self):
         """return file meta data"""
+        if self.fd.mode == FileDescriptor.VARIABLE:
+            self.load()  # record count of VARIABLE files is not stored in FDR
         return self.fd.get_info()
 
 
@@ -1247,6 +1663,153 @@ class Xdm99Console(Console):
         self.clear(category)
 
 
+# Catalog index
+
+class CatalogIndex:
+    """persistent catalog of disk image collections, stored as sqlite database"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime INTEGER, size INTEGER, hash TEXT, name TEXT,
+            volume INTEGER);
+        CREATE TABLE IF NOT EXISTS files (
+            image INTEGER, name TEXT, format TEXT, sectors INTEGER, size INTEGER, record_len INTEGER,
+            records INTEGER, hash TEXT);
+        CREATE INDEX IF NOT EXISTS files_name ON files (name);
+        CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+        CREATE INDEX IF NOT EXISTS files_image ON files (image);
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename or CatalogIndex.default_filename()
+        if os.path.dirname(self.filename):
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        self.db = sqlite3.connect(self.filename)
+        self.db.executescript(CatalogIndex.SCHEMA)
+        if 'volume' not in [column[1] for column in self.db.execute('PRAGMA table_info(images)')]:
+            self.db.execute('ALTER TABLE images ADD COLUMN volume INTEGER')  # index of earlier version
+
+    @staticmethod
+    def default_filename():
+        """return location of index in user cache directory"""
+        return Util.cache_filename('xdm99-index.db')
+
+    @staticmethod
+    def catalog_image(image):
+        """return disk name and catalog of disk image as list of (name, format, sectors, size, record_len, records,
+           hash) of its files
+        """
+        disk = Disk(image, console=Xdm99Console(Warnings({}, none=True)))
+        files = []
+        for name in sorted(disk.catalog):
+            file = disk.catalog[name]
+            contents = file.get_contents()
+            files.append((name, file.fd.format, file.fd.total_sectors + 1, file.fd.size, file.fd.record_len,
+                          file.fd.lv3_records, hashlib.sha1(contents).hexdigest()))
+        return disk.name, files
+
+    @staticmethod
+    def scan_image(job):
+        """read catalog of disk image in worker process, skip catalog if image contents are unchanged"""
+        path, old_hash = job
+        try:
+            with open(path, 'rb') as f:
+                image = f.read()
+            hash_ = hashlib.sha1(image).hexdigest()
+            if hash_ == old_hash:
+                return hash_, None, None, None
+            name, files = CatalogIndex.catalog_image(image)
+            return hash_, name, files, None
+        except IOError as e:
+            return None, None, None, f'{e.filename}: {e.strerror}'
+        except (ContainerError, FileError, IndexError) as e:
+            return None, None, None, str(e) or 'Invalid disk image'
+
+    def refresh(self, images, folders, console, jobs=None):
+        """add new or changed images, remove deleted images or images of folders, return number of added/updated
+           and removed images; volumes of CF cards indexed by xvm99 are left alone
+        """
+        known = {path: (mtime, size, hash_)
+                 for path, mtime, size, hash_ in self.db.execute(
+                    'SELECT path, mtime, size, hash FROM images WHERE volume IS NULL')}
+        paths = {os.path.abspath(image) for image in images}
+        changed = []
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed below
+            mtime, size, hash_ = known.get(path, (None, None, None))
+            if (mtime, size) != (stat.st_mtime_ns, stat.st_size):
+                changed.append((path, stat.st_mtime_ns, stat.st_size, hash_))
+        updated = removed = 0
+        with self.db:
+            if changed:
+                with multiprocessing.Pool(jobs) as pool:
+                    scans = pool.imap(CatalogIndex.scan_image, [(path, hash_) for path, _, _, hash_ in changed],
+                                      chunksize=8)
+                    for (path, mtime, size, old_hash), (hash_, name, files, error) in zip(changed, scans):
+                        if files is None and not error:
+                            self.db.execute('UPDATE images SET mtime = ?, size = ? WHERE path = ?', (mtime, size, path))
+                            continue
+                        self.store(path, mtime, size, hash_, name, files)  # invalid images are kept without files
+                        if error:
+                            console.error(f'{path}: {error}')
+                        else:
+                            updated += 1
+            # images deleted from indexed directories
+            roots = [os.path.join(os.path.abspath(folder), '') for folder in folders]
+            for path in known:
+                if (path in paths or any(path.startswith(root) for root in roots)) and not os.path.exists(path):
+                    removed += self.remove(path)
+        return updated, removed
+
+    def hashes(self, prefix=''):
+        """return hashes of indexed images whose path starts with prefix"""
+        return dict(self.db.execute('SELECT path, hash FROM images WHERE substr(path, 1, ?) = ?',
+                                    (len(prefix), prefix)))
+
+    def store(self, path, mtime, size, hash_, name, files, volume=None):
+        """replace image or volume of CF card and its files in index"""
+        self.remove(path)
+        image_id = self.db.execute(
+            'INSERT INTO images (path, mtime, size, hash, name, volume) VALUES (?, ?, ?, ?, ?, ?)',
+            (path, mtime, size, hash_, name, volume)).lastrowid
+        if files:
+            self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                [(image_id, *file) for file in files])
+
+    def remove(self, path):
+        """remove image and its files from index"""
+        row = self.db.execute('SELECT id FROM images WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return 0
+        self.db.execute('DELETE FROM files WHERE image = ?', row)
+        self.db.execute('DELETE FROM images WHERE id = ?', row)
+        return 1
+
+    def find(self, patterns, format_=None, prefix=''):
+        """return files matching name patterns and format in images whose path starts with prefix as list of
+           (image, name, format, sectors, size, records)
+        """
+        globs = [pattern.replace('[', '[[]') for pattern in patterns]
+        query = ('SELECT images.path, files.name, files.format, files.sectors, files.size, files.records '
+                 'FROM files JOIN images ON files.image = images.id WHERE (' +
+                 ' OR '.join('files.name GLOB ?' for _ in globs) + ')')
+        args = globs
+        if format_:
+            query += ' AND files.format = ?'
+            args.append(format_)
+        if prefix:
+            query += ' AND substr(images.path, 1, ?) = ?'
+            args += [len(prefix), prefix]
+        query += ' ORDER BY images.path, files.name'
+        return self.db.execute(query, args).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
 # Command line processing
 
 class Xdm99Processor(CommandProcessor):
@@ -1264,6 +1827,8 @@ class Xdm99Processor(CommandProcessor):
         self.format = None
         self.is_display_format = False
         self.prepare_fn = None
+        self.parser = None
+        self.jobs = None
 
     def main(self, external_data=None, external_options=()):
         self.external_data = external_data
@@ -1307,6 +1872,8 @@ class Xdm99Processor(CommandProcessor):
                          help='attempt to repair disk image')
         cmd.add_argument('-S', '--sector', dest='sector', metavar='<sector>',
                          help='dump disk sector')
+        cmd.add_argument('-B', '--batch', dest='batch', metavar='<file>',
+                         help='run commands from file on image or archive, saving only if all succeed')
         cmd.add_argument('--compress', action='store_true', dest='compress',
                          help=argparse.SUPPRESS)
         cmd.add_argument('--decompress', action='store_true', dest='decompress',
@@ -1323,6 +1890,16 @@ class Xdm99Processor(CommandProcessor):
                          metavar='<file>', help='show information about file in FIAD format')
 
         # general options
+        args.add_argument('--bulk', action=GlobStore, dest='bulk', nargs='+', metavar='<image>',
+                          help='catalog, extract, or check multiple disk images or directories of images')
+        args.add_argument('-j', '--jobs', dest='jobs', metavar='<count>',
+                          help='number of parallel jobs for bulk processing')
+        args.add_argument('--index', action=GlobStore, dest='index', nargs='+', metavar='<image>',
+                          help='add or refresh disk images or directories of images in catalog index')
+        args.add_argument('--find', dest='find', nargs='+', metavar='<name>',
+                          help='find files in catalog index, optionally of format given by -f')
+        args.add_argument('--index-file', dest='indexfile', metavar='<file>',
+                          help='location of catalog index')
         args.add_argument('-K', '--archive', dest='archive', metavar='<archive>',
                           help='name of archive (on disk image or local machine')
         args.add_argument('-t', '--tifiles', action='store_true', dest='astifiles',
@@ -1359,11 +1936,17 @@ class Xdm99Processor(CommandProcessor):
         else:
             # also parse non-recognized options from parent tool
             self.opts = args.parse_args(args=sys.argv[1:] + list(self.external_options))
+        self.parser = args  # for batch commands
         self.fix_greedy_list_parsing('filename', 'print_', 'extract', 'add', 'exark', 'addark', 'rename', 'delete',
-                                     'protect', 'printfiad', 'fromfiad', 'tofiad', 'infofiad')
-
-        if not (self.opts.filename or self.opts.archive or self.opts.fromfiad or self.opts.tofiad or
-                self.opts.printfiad or self.opts.infofiad):
+                                     'protect', 'printfiad', 'fromfiad', 'tofiad', 'infofiad', 'bulk', 'index',
+                                     'find')
+
+        if self.opts.bulk and (self.opts.filename or self.opts.archive):
+            args.error('Disk image or archive not permitted for bulk processing')
+        if (self.opts.index or self.opts.find) and (self.opts.filename or self.opts.archive or self.opts.bulk):
+            args.error('Disk image or archive not permitted for catalog index')
+        if not (self.opts.filename or self.opts.bulk or self.opts.index or self.opts.find or self.opts.archive or
+                self.opts.fromfiad or self.opts.tofiad or self.opts.printfiad or self.opts.infofiad):
             args.error('Disk image or archive required')
         if self.opts.init and not self.opts.filename or self.opts.initarc and not self.opts.archive:
             args.error('Incorrect initialization')
@@ -1375,17 +1958,25 @@ class Xdm99Processor(CommandProcessor):
                              Warnings.IMAGE: True},
                             none=self.opts.quiet)
         self.console = Xdm99Console(warnings, colors=self.opts.color)
-        self.format = self.opts.format.upper() if self.opts.format else 'PROGRAM'
-        self.is_display_format = self.format and 'D' in self.format
+        self.set_format()
         if self.opts.compress or self.opts.decompress:
             self.run_archive()
         elif self.opts.fromfiad or self.opts.tofiad or self.opts.printfiad or self.opts.infofiad:
             self.run_tifiles()
         elif self.opts.sector:
             self.run_sector()
+        elif self.opts.bulk:
+            self.run_bulk()
+        elif self.opts.index or self.opts.find:
+            self.run_index()
         else:
             self.run_container()
-    
+
+    def set_format(self):
+        """set TI file format for files to add"""
+        self.format = self.opts.format.upper() if self.opts.format else 'PROGRAM'
+        self.is_display_format = self.format and 'D' in self.format
+
     def run_archive(self):
         self.data = Util.readdata(self.opts.filename)
         if File.is_tifiles(self.data):
@@ -1404,7 +1995,7 @@ class Xdm99Processor(CommandProcessor):
         """format binary string as hex dump (for -S)"""
         if not self.opts.filename:
             ContainerError('Missing filename')
-        disk = Disk(Util.readdata(self.opts.filename), console=self.console)
+        disk = Disk(Util.mapdata(self.opts.filename), console=self.console)
         self.opts.quiet = True
         try:
             sector_no = Util.xint(self.opts.sector)
@@ -1429,6 +2020,45 @@ class Xdm99Processor(CommandProcessor):
         self.data = ''.join(dump)
         self.prepare_fn = self.prepare_sector
 
+    def run_bulk(self):
+        """process multiple disk images in parallel"""
+        if (self.opts.exark or self.opts.add or self.opts.addark or self.opts.rename or self.opts.delete or
+                self.opts.protect or self.opts.resize or self.opts.geometry or self.opts.repair or self.opts.batch or
+                self.opts.name or self.opts.init or self.opts.initarc):
+            raise ContainerError('Operation not permitted for bulk processing')
+        try:
+            self.jobs = Util.xint(self.opts.jobs) if self.opts.jobs else None  # default is CPU count
+        except ValueError:
+            raise ContainerError('Invalid job count: ' + self.opts.jobs)
+        self.prepare_fn = self.prepare_bulk
+
+    def run_index(self):
+        """update or query catalog index"""
+        try:
+            self.jobs = Util.xint(self.opts.jobs) if self.opts.jobs else None
+        except ValueError:
+            raise ContainerError('Invalid job count: ' + self.opts.jobs)
+        self.prepare_fn = self.prepare_index
+
+    @staticmethod
+    def find_images(paths):
+        """return disk images given or contained in directories, with directory relative to search path"""
+        images = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    images.extend((os.path.join(root, name), os.path.relpath(root, path))
+                                  for name in sorted(files) if name.lower().endswith('.dsk'))
+            else:
+                images.append((path, ''))
+        return images
+
+    def bulk_images(self):
+        """return disk images and their output directories for bulk processing"""
+        return [(image, os.path.normpath(os.path.join(self.opts.output or '', folder, Util.barename(image))))
+                for image, folder in self.find_images(self.opts.bulk)]
+
     def run_container(self):
         """container image manipulation"""
         archive = None
@@ -1439,7 +2069,7 @@ class Xdm99Processor(CommandProcessor):
                                               Util.to_ti(self.opts.name) or Util.tiname(self.opts.filename))
                 self.disk = Disk(disk_image, console=self.console, init=True)
             else:
-                disk_image = self.external_data or Util.readdata(self.opts.filename)
+                disk_image = self.external_data or Util.mapdata(self.opts.filename)
                 self.disk = Disk(disk_image, console=self.console)
         if self.opts.archive:
             if self.opts.initarc:
@@ -1480,10 +2110,51 @@ class Xdm99Processor(CommandProcessor):
         else:
             self.other_tifiles()
 
+    def prepare_bulk(self):
+        """distribute images to worker processes, output results in order of images"""
+        images = self.bulk_images()
+        with multiprocessing.Pool(self.jobs) as pool:
+            for (image, _), (results, console, rc) in zip(images, pool.imap(partial(bulk_job, self.opts), images)):
+                for file in results:
+                    file.write(encoding=self.opts.encoding)
+                for severity, info, message, category in console.console:
+                    self.console.console.append((severity, info, f'{image}: {message}', category))
+                self.console.errors |= console.errors
+                self.console.entries |= console.entries
+                self.rc = max(self.rc, rc)
+
+    def prepare_index(self):
+        index = CatalogIndex(self.opts.indexfile)
+        try:
+            if self.opts.index:
+                images = [image for image, _ in self.find_images(self.opts.index)]
+                folders = [path for path in self.opts.index if os.path.isdir(path)]
+                updated, removed = index.refresh(images, folders, self.console, jobs=self.jobs)
+                self.result.append(RContainer(f'{updated} images indexed, {removed} images removed\n', '-',
+                                              istext=True))
+            if self.opts.find:
+                format_ = FileDescriptor.create('FIND', self.opts.format).format if self.opts.format else None
+                found = []
+                for image, name, fmt, sectors, size, records in index.find(self.opts.find, format_):
+                    recs = '' if fmt == 'PROGRAM' else f'{records:3d} recs'
+                    line = f'{image}: {name:10s} {sectors:4d}  {fmt:11s} {size:6d} B {recs:>9s}'
+                    found.append(line.rstrip() + '\n')
+                self.result.append(RContainer(''.join(found), '-', istext=True))
+        finally:
+            index.close()
+
     def prepare_sector(self):
         self.result.append(RContainer(self.data, '-', istext=True))
 
     def prepare_container(self):
+        if self.opts.batch:
+            self.batch()
+        else:
+            self.command()
+        self.update_container()
+
+    def command(self):
+        """run single container command"""
         if self.opts.print_:
             self.print_()
         elif self.opts.extract:
@@ -1512,7 +2183,38 @@ class Xdm99Processor(CommandProcessor):
             self.set_name()
         elif self.opts.info or (not self.opts.init and not self.opts.initarc):
             self.info()  # default except when creating new container
-        self.update_container()
+
+    def batch(self):
+        """run commands from batch file on same container, container is written only if no command fails"""
+        opts = self.opts
+        try:
+            for lino, line in enumerate(Util.readlines(opts.batch), start=1):
+                args = shlex.split(line, comments=True)
+                if not args:
+                    continue
+                self.opts = self.parse_batch_command(args, lino)
+                self.set_format()
+                count = len(self.result)
+                try:
+                    self.command()
+                except (ContainerError, FileError) as e:
+                    raise ContainerError(f'{opts.batch}, line {lino}: {e}')
+                if self.opts.output:
+                    for result in self.result[count:]:
+                        result.output = self.opts.output
+        finally:
+            self.opts = opts
+            self.set_format()
+
+    def parse_batch_command(self, args, lino):
+        """parse command line of batch file, returning options for command"""
+        opts = self.parser.parse_args(args=args)
+        if (opts.filename or opts.archive or opts.init or opts.initarc or opts.batch or opts.sector or
+                opts.compress or opts.decompress or opts.fromfiad or opts.tofiad or opts.printfiad or
+                opts.infofiad):
+            raise ContainerError(f'{self.opts.batch}, line {lino}: Command not permitted in batch file')
+        opts.filename, opts.archive, opts.quiet = self.opts.filename, self.opts.archive, self.opts.quiet
+        return opts
 
     def compress(self):
         self.result.append(RContainer(LZW.compress(self.data), self.opts.filename, ext='.cpr'))
@@ -1655,13 +2357,22 @@ class Xdm99Processor(CommandProcessor):
                 self.disk.add_files((file,))
             if self.container.modified or (self.disk and self.disk.modified):
                 # disk with archive
-                self.result.append(RContainer(self.disk.get_image(), self.opts.filename, iscontainer=True))
+                self.result.append(self.disk_result())
         elif self.container.modified:
             # disk or stand-alone archive
-            self.result.append(RContainer(self.container.get_image(), self.container_name, iscontainer=True))
+            if self.container is self.disk:
+                self.result.append(self.disk_result())
+            else:
+                self.result.append(RContainer(self.container.get_image(), self.container_name, iscontainer=True))
         elif self.disk and self.disk.modified:
             # disk only initialized
-            self.result.append(RContainer(self.disk.get_image(), self.opts.filename, iscontainer=True))
+            self.result.append(self.disk_result())
+
+    def disk_result(self):
+        """return modified disk image as output container"""
+        if self.disk.is_mapped() or self.disk.is_provided():
+            return RDisk(self.disk, self.opts.filename)  # write back modified sectors only
+        return RContainer(self.disk.get_image(), self.opts.filename, iscontainer=True)
 
     def output(self):
         if self.external_data is not None:
@@ -1677,6 +2388,32 @@ class Xdm99Processor(CommandProcessor):
         return 1 if self.console.errors else self.rc
 
 
+def bulk_job(opts, image):
+    """process single disk image of bulk operation in worker process, returning results and messages"""
+    image, output = image
+    processor = Xdm99Processor()
+    processor.opts = copy(opts)
+    processor.opts.bulk = None
+    processor.opts.filename = image
+    processor.opts.output = None  # set for each result file
+    try:
+        processor.run()
+        processor.prepare()
+    except IOError as e:
+        processor.console.error(f'{e.filename}: {e.strerror}')
+        processor.result = []
+    except (ContainerError, FileError) as e:
+        processor.console.error(str(e))
+        processor.result = []
+    results = [RContainer(f'{image}:\n', '-', istext=True)] if processor.result and not opts.extract else []
+    for file in processor.result:
+        if file.name != '-':
+            os.makedirs(output, exist_ok=True)
+            file.output = output
+        results.append(file)
+    return results, processor.console, processor.rc
+
+
 if __name__ == '__main__':
     status = Xdm99Processor().main()
     sys.exit(status)
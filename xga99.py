@@ -25,6 +25,7 @@ import math
 import re
 import argparse
 import zipfile
+import bisect
 from xcommon import CommandProcessor, RFile, Util, Warnings, Console
 
 
@@ -426,7 +427,8 @@ class Symbols:
         self.pass_no = 0
         self.LC = 0
         self.lidx = 0
-        self.locations = []  # listing of (lidx, name), must not be deleted between passes
+        self.locations = set()  # (lidx, name) of labels, must not be deleted between passes
+        self.local_locations = {}  # local name: (sorted lidx of local labels, names of local labels)
         self.definitions = {
             'MAXMEM': 0x8370,   # CPU RAM
             'DATSTK': 0x8372,
@@ -529,12 +531,18 @@ class Symbols:
     def add_label(self, label, tracked=False, check=True, lino=None, filename=None):
         """add label, in every pass to update its LC"""
         name = self.add_symbol(label, Address(self.LC), tracked=tracked, check=check, lino=lino, filename=filename)
-        if (self.lidx, name) not in self.locations:
-            self.locations.append((self.lidx, name))
+        self.locations.add((self.lidx, name))
 
     def add_local_label(self, label):
         """add local label, in every pass to update its LC"""
-        self.add_label(label + '$' + str(self.lidx), check=False)
+        name = label + '$' + str(self.lidx)
+        known = (self.lidx, name) in self.locations
+        self.add_label(name, check=False)
+        if not known:
+            lidxs, names = self.local_locations.setdefault(label, ([], []))
+            i = bisect.bisect_right(lidxs, self.lidx)  # after labels of same lidx
+            lidxs.insert(i, self.lidx)
+            names.insert(i, name)
 
     def add_env(self, definitions):
         """add external symbol definitions (-D)"""
@@ -562,15 +570,12 @@ class Symbols:
     def get_local(self, name, distance):
         if self.pass_no == 0:
             return 0
-        targets = [(loc, sym) for (loc, sym) in self.locations if sym[:len(name) + 1] == name + '$']
+        lidxs, names = self.local_locations.get(name, ((), ()))
+        i = bisect.bisect_left(lidxs, self.lidx)  # first label at or after current line, or beyond last label
+        if distance > 0 and i < len(lidxs) and lidxs[i] > self.lidx:
+            distance -= 1  # i points to +! unless lidx == self.lidx
         try:
-            i, lidx = next((j, l) for j, (l, n) in enumerate(targets) if l >= self.lidx)
-            if distance > 0 and lidx > self.lidx:
-                distance -= 1  # i points to +! unless lidx == self.lidx
-        except StopIteration:
-            i = len(targets)  # beyond last label
-        try:
-            _, fullname = targets[i + distance]
+            fullname = names[i + distance]
         except IndexError:
             return None
         return self.get_symbol(fullname)
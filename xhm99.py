@@ -22,6 +22,7 @@
 import sys
 import os.path
 import argparse
+import binascii
 import xdm99 as xdm
 from xcommon import Util, RContainer, CommandProcessor, GlobStore, Warnings, Console
 
@@ -39,6 +40,7 @@ class SDFormat:
 
     SECTORS = 9
     TRACK_LEN = 17 + 9 * 334 + 113  # 3136
+    STREAM_LEN = 4 * TRACK_LEN  # encoded track
 
     LEADIN = [0xaa, 0xa8, 0xa8, 0x22] + [0xaa] * (4 * 16)  # fc ff
     LV_LEADIN = 17
@@ -156,30 +158,29 @@ class SDFormat:
         [0xaa, 0xaa, 0xaa, 0xaa]
     ]
 
+    # data bits contained in each byte of encoded 4-byte groups
+    FM_LANES = tuple(bytes((b & 0x80 and hi) | (b & 0x08 and lo) for b in range(256))
+                     for hi, lo in ((0x40, 0x80), (0x10, 0x20), (0x04, 0x08), (0x01, 0x02)))
+    # encoded bytes of 4-byte groups, by position in group
+    FM_ENCODE_LANES = tuple(bytes(lane) for lane in zip(*FM_CODES))
+
     @classmethod
     def decode(cls, stream):
         """decode FM bit stream into bytes"""
-        bytes_ = []
-        for i in range(0, len(stream), 4):
-            enc_byte = Util.rordl(stream[i:i + 4])
-            # bit format:  ABCDEFGH <->  H...G... F...E... D...C... B...A...
-            byte_ = ((0x01 if enc_byte & 0x80000000 else 0) |
-                     (0x02 if enc_byte & 0x08000000 else 0) |
-                     (0x04 if enc_byte & 0x00800000 else 0) |
-                     (0x08 if enc_byte & 0x00080000 else 0) |
-                     (0x10 if enc_byte & 0x00008000 else 0) |
-                     (0x20 if enc_byte & 0x00000800 else 0) |
-                     (0x40 if enc_byte & 0x00000080 else 0) |
-                     (0x80 if enc_byte & 0x00000008 else 0))
-            bytes_.append(byte_)
-        return bytes_
+        # bit format:  ABCDEFGH <->  H...G... F...E... D...C... B...A...
+        size = len(stream) // 4
+        stream = memoryview(stream)
+        value = 0
+        for lane, table in enumerate(cls.FM_LANES):
+            value |= int.from_bytes(bytes(stream[lane:size * 4:4]).translate(table), 'big')
+        return value.to_bytes(size, 'big')
 
     @classmethod
     def encode(cls, track):
         """encode SD track into FM bit stream"""
-        stream = []
-        for byte_ in track:
-            stream.extend(cls.FM_CODES[byte_])
+        stream = bytearray(4 * len(track))
+        for lane, table in enumerate(cls.FM_ENCODE_LANES):
+            stream[lane::4] = track.translate(table)
         return stream
 
     @classmethod
@@ -201,6 +202,7 @@ class DDFormat:
 
     SECTORS = 18
     TRACK_LEN = 32 + 18 * 342 + 84  # 6272
+    STREAM_LEN = 2 * TRACK_LEN  # encoded track
 
     LEADIN = [0x49, 0x2a] * 32  # 4e
     LV_LEADIN = 32
@@ -293,6 +295,9 @@ class DDFormat:
         [0xaa, 0x52], [0xaa, 0x92], [0xaa, 0x22], [0xaa, 0xa2],
         [0xaa, 0x4a], [0xaa, 0x8a], [0xaa, 0x2a], [0xaa, 0xaa],
     ]
+    decode_lookup = None  # built on first use
+    MFM_ENCODE_LANES = tuple(bytes(lane) for lane in zip(*MVM_CODES))
+    CLOCK_MASKS = bytes(0xfe if b & 0x80 else 0xff for b in range(256))
 
     @classmethod
     def interleave(cls, side, track, sector, wtf80t):
@@ -301,36 +306,42 @@ class DDFormat:
     @classmethod
     def decode(cls, stream):
         """decode MFM bit stream into bytes"""
-        lookup = {(word[0] << 8) | word[1]: i for i, word in enumerate(cls.MVM_CODES)}
-        bytes_ = []
-        for idx in range(0, len(stream), 2):
-            w = Util.ordw(stream[idx:idx + 2])
-            if w == cls.ADDRESS_MARK_WORD:  # address mark
-                b = cls.V_ADDRESS_MARK_BYTE
-            else:
-                try:
-                    b = lookup[w]
-                except KeyError:
-                    # NOTE: no such collisions in lookup table!
-                    b = lookup[w | 0x0100]  # extra clock bit
-            bytes_.append(b)
-        return bytes_
+        table = cls.decode_table()
+        words = memoryview(stream)[:len(stream) & ~1].cast('H')  # native byte order
+        try:
+            return bytes(map(table.__getitem__, words))
+        except TypeError:
+            raise HFEError('Invalid MFM encoding')
+
+    @classmethod
+    def decode_table(cls):
+        """return table mapping native 16-bit words to bytes, with None for invalid words"""
+        if cls.decode_lookup is None:
+            lookup = {(word[0] << 8) | word[1]: i for i, word in enumerate(cls.MVM_CODES)}
+            lookup[cls.ADDRESS_MARK_WORD] = cls.V_ADDRESS_MARK_BYTE  # address mark
+            table = [None] * 0x10000
+            for w in range(0x10000):
+                # NOTE: no such collisions in lookup table!
+                b = lookup.get(w, lookup.get(w | 0x0100))  # extra clock bit
+                table[w if sys.byteorder == 'big' else (w & 0xff) << 8 | w >> 8] = b
+            cls.decode_lookup = table
+        return cls.decode_lookup
 
     @classmethod
     def encode(cls, track):
         """encode SD track into MFM bit stream"""
-        stream = []
-        for byte_ in track:
-            w = cls.MVM_CODES[byte_]
-            stream.extend(w)
+        stream = bytearray(2 * len(track))
+        for lane, table in enumerate(cls.MFM_ENCODE_LANES):
+            stream[lane::2] = track.translate(table)
         return stream
 
     @classmethod
     def fix_clocks(cls, stream):
         """fix clock bits in stream (inline)"""
-        for idx in range(1, len(stream), 2):
-            if stream[idx] & 0x80:
-                stream[idx + 1] &= 0xfe
+        # clear leading clock bit of words following a word that ends with a data bit
+        masks = bytes(stream[1:-1:2]).translate(cls.CLOCK_MASKS)
+        words = int.from_bytes(stream[2::2], 'big') & int.from_bytes(masks, 'big')
+        stream[2::2] = words.to_bytes(len(masks), 'big')
 
 
 class HFEDisk:
@@ -342,11 +353,15 @@ class HFEDisk:
     HFE_DD_ENCODING = 0
     VALID_ENCODINGS = [0, 2]
 
+    HEADER_LEN = 1024  # header and LUT
+    WRITE_PROTECTED = 20
+
     def __init__(self, image):
         """create HFE disk from HFE image"""
         self.header = image[0:512]
         self.lut = image[512:1024]
-        self.trackdata = image[1024:]
+        self.trackdata = image[HFEDisk.HEADER_LEN:]
+        self.crc_errors = set()  # sectors with CRC errors found when extracting sectors
 
         self.tracks, self.sides, self.encoding, self.ifmode = self.get_hfe_params(self.header)
         if self.encoding != HFEDisk.HFE_SD_ENCODING and self.encoding != HFEDisk.HFE_DD_ENCODING:
@@ -380,51 +395,80 @@ class HFEDisk:
         tracks1.reverse()
         return tracks0 + tracks1
 
+    def get_track(self, track_no):
+        """return decoded data of single track, with tracks numbered as in disk image"""
+        fmt = DDFormat if self.dd else SDFormat
+        data = memoryview(self.trackdata)
+        return fmt.decode(b''.join(data[i:i + 256] for i in self.get_track_offsets(track_no)))
+
+    def get_track_offsets(self, track_no):
+        """return offsets of 256 byte chunks of encoded track in track data"""
+        fmt = DDFormat if self.dd else SDFormat
+        side, cylinder = divmod(track_no, self.tracks)
+        if side:
+            cylinder = self.tracks - 1 - cylinder  # 0 .. 39 39 .. 0
+        size = 2 * fmt.STREAM_LEN  # both sides, interleaved in 256 byte chunks
+        return range(cylinder * size + side * 256, (cylinder + 1) * size, 512)
+
     def extract_sectors(self, tracks):
         """extract sector data from listing of track data"""
         fmt = DDFormat if self.dd else SDFormat
-        sectors = []
+        self.crc_errors = set()
         if len(tracks) != self.sides * self.tracks:
             raise HFEError('Invalid track count')
         assert len(tracks[0]) == fmt.TRACK_LEN
-        for track in tracks:
-            h0, h1 = 0, fmt.LV_LEADIN  # leadin is track[h0:h1]
-            track_sectors = {}
-            for i in range(fmt.SECTORS):
-                # pregap
-                h0, h1 = h1, h1 + fmt.LV_PREGAP
-                # pregap at track[h0:h1]
-                # ID address mark
-                h0, h1 = h1, h1 + fmt.LV_ADDRESS_MARK
-                address_mark = track[h0:h1]
-                assert address_mark == fmt.V_ADDRESS_MARK
-                # sector ID
-                h0, h1 = h1, h1 + 6
-                # track_id at track[h0]
-                # side_id at track[h0 + 1]
-                sector_id = track[h0 + 2]
-                assert sector_id not in track_sectors
-                # size_id at track[h0 + 3]
-                # crc1 at track[h0 + 4:h0 + 6]
-                # gap1
-                h0, h1 = h1, h1 + fmt.LV_GAP1
-                # gap1 at track[h0:h1]
-                # data mark
-                h0, h1 = h1, h1 + fmt.LV_DATA_MARK
-                data_mark = track[h0:h1]
-                assert data_mark == fmt.V_DATA_MARK
-                # sector data
-                h0, h1 = h1, h1 + 258
-                track_sectors[sector_id] = track[h0:h0 + 256]
-                # crc2 at track[h0 + 256:h0 + 258]
-                # gap2
-                h0, h1 = h1, h1 + fmt.LV_GAP2
-                # gap2 at track[h0:h1]
-            # leadout
-            h0, h1 = h1, h1 + fmt.LV_LEADOUT
-            assert h1 == len(track)
-            sectors.extend(Util.flatten(track_sectors[sector_id] for sector_id in sorted(track_sectors)))
-        return bytes(sectors)
+        return b''.join(self.extract_track_sectors(track_no, track) for track_no, track in enumerate(tracks))
+
+    def extract_track_sectors(self, track_no, track):
+        """extract sector data from track data, collecting sectors with CRC errors"""
+        fmt = DDFormat if self.dd else SDFormat
+        h0, h1 = 0, fmt.LV_LEADIN  # leadin is track[h0:h1]
+        track_sectors = {}
+        for i in range(fmt.SECTORS):
+            # pregap
+            h0, h1 = h1, h1 + fmt.LV_PREGAP
+            # pregap at track[h0:h1]
+            # ID address mark
+            h0, h1 = h1, h1 + fmt.LV_ADDRESS_MARK
+            address_mark = track[h0:h1]
+            assert list(address_mark) == fmt.V_ADDRESS_MARK
+            crc_start = h0  # CRC includes mark
+            # sector ID
+            h0, h1 = h1, h1 + 6
+            # track_id at track[h0]
+            # side_id at track[h0 + 1]
+            sector_id = track[h0 + 2]
+            assert sector_id not in track_sectors
+            # size_id at track[h0 + 3]
+            # crc1 at track[h0 + 4:h0 + 6]
+            if HFEDisk.crc16(0xffff, track[crc_start:h0 + 4]) != track[h0 + 4:h0 + 6]:
+                self.crc_errors.add((track_no * fmt.SECTORS + sector_id, 'ID'))
+            # gap1
+            h0, h1 = h1, h1 + fmt.LV_GAP1
+            # gap1 at track[h0:h1]
+            # data mark
+            h0, h1 = h1, h1 + fmt.LV_DATA_MARK
+            data_mark = track[h0:h1]
+            assert list(data_mark) == fmt.V_DATA_MARK
+            crc_start = h0
+            # sector data
+            h0, h1 = h1, h1 + 258
+            track_sectors[sector_id] = track[h0:h0 + 256]
+            # crc2 at track[h0 + 256:h0 + 258]
+            if HFEDisk.crc16(0xffff, track[crc_start:h0 + 256]) != track[h0 + 256:h0 + 258]:
+                self.crc_errors.add((track_no * fmt.SECTORS + sector_id, 'data'))
+            # gap2
+            h0, h1 = h1, h1 + fmt.LV_GAP2
+            # gap2 at track[h0:h1]
+        # leadout
+        h0, h1 = h1, h1 + fmt.LV_LEADOUT
+        assert h1 == len(track)
+        return b''.join(track_sectors[sector_id] for sector_id in sorted(track_sectors))
+
+    def verify_sectors(self):
+        """check CRCs of all ID and data fields, return sectors with CRC errors"""
+        self.extract_sectors(self.get_tracks())
+        return sorted(self.crc_errors)
 
     @classmethod
     def create_from_disk(cls, image):
@@ -470,42 +514,158 @@ class HFEDisk:
     @classmethod
     def create_tracks(cls, tracks, sides, fmt, sectors):
         """create HFE tracks"""
+        size = fmt.SECTORS * 256
         track_data = ([], [])
         for s in range(sides):
             for j in range(tracks):
-                sector_data = []
-                for i in range(fmt.SECTORS):
-                    track_id = tracks - 1 - j if s else j  # 0 .. 39 39 .. 0
-                    sector_id = fmt.interleave(s, j, i, tracks == 80)
-                    offset = ((s * tracks + j) * fmt.SECTORS + sector_id) * 256
-                    sector = [b for b in sectors[offset:offset + 256]]
-                    addr = [track_id, s, sector_id, 0x01]
-                    crc1 = HFEDisk.crc16(0xffff, fmt.V_ADDRESS_MARK + addr)
-                    crc2 = HFEDisk.crc16(0xffff, fmt.V_DATA_MARK + sector)
-                    sector_data.extend(
-                        fmt.PREGAP +
-                        fmt.ADDRESS_MARK +
-                        fmt.encode(addr + crc1) +
-                        fmt.GAP1 +
-                        fmt.DATA_MARK +
-                        fmt.encode(sector + crc2) +
-                        fmt.GAP2)
-                fmt.fix_clocks(sector_data)
-                track = fmt.LEADIN + sector_data + fmt.LEADOUT
-                track_data[s].append(bytes(track))
+                track_no = s * tracks + j
+                track_data[s].append(cls.create_track(fmt, tracks, track_no,
+                                                      sectors[track_no * size:(track_no + 1) * size]))
         track_data[1].reverse()
         return b''.join(track_data[0]), b''.join(track_data[1])
 
+    @classmethod
+    def create_track(cls, fmt, tracks, track_no, sectors):
+        """create single HFE track from its sectors, with tracks numbered as in disk image"""
+        leadin, leadout = bytes(fmt.LEADIN), bytes(fmt.LEADOUT)
+        pregap = bytes(fmt.PREGAP + fmt.ADDRESS_MARK)
+        gap1 = bytes(fmt.GAP1 + fmt.DATA_MARK)
+        gap2 = bytes(fmt.GAP2)
+        address_mark, data_mark = bytes(fmt.V_ADDRESS_MARK), bytes(fmt.V_DATA_MARK)
+        s, j = divmod(track_no, tracks)
+        track_id = tracks - 1 - j if s else j  # 0 .. 39 39 .. 0
+        sector_data = []
+        for i in range(fmt.SECTORS):
+            sector_id = fmt.interleave(s, j, i, tracks == 80)
+            sector = bytes(sectors[sector_id * 256:(sector_id + 1) * 256])
+            addr = bytes((track_id, s, sector_id, 0x01))
+            crc1 = HFEDisk.crc16(0xffff, address_mark + addr)
+            crc2 = HFEDisk.crc16(0xffff, data_mark + sector)
+            sector_data.extend((pregap, fmt.encode(addr + crc1), gap1, fmt.encode(sector + crc2), gap2))
+        sector_data = bytearray(b''.join(sector_data))
+        fmt.fix_clocks(sector_data)
+        return leadin + sector_data + leadout
+
     @staticmethod
     def crc16(crc, stream):
         """compute CRC-16 code"""
-        msb, lsb = crc >> 8, crc & 0xff
-        for b in stream:
-            x = b ^ msb
-            x ^= (x >> 4)
-            msb = (lsb ^ (x >> 3) ^ (x << 4)) & 0xff
-            lsb = (x ^ (x << 5)) & 0xff
-        return [msb, lsb]
+        return binascii.crc_hqx(bytes(stream), crc).to_bytes(2, 'big')
+
+
+class HFESectors:
+    """sectors of disk image contained in HFE image, decoded by track on demand, used like a bytearray by Disk"""
+
+    CACHED_TRACKS = 8
+
+    def __init__(self, hfe):
+        fmt = DDFormat if hfe.dd else SDFormat
+        if Util.used(len(hfe.trackdata), 2 * fmt.STREAM_LEN) != hfe.tracks:
+            raise HFEError('Invalid track count')
+        self.sectors = hfe.sides * hfe.tracks * fmt.SECTORS  # number of sectors provided
+        self.hfe = hfe
+        self.sectors_per_track = fmt.SECTORS
+        self.cache = {}  # sector data of recently decoded tracks, least recently used first
+        self.modified_tracks = {}  # sector data of tracks with modified sectors
+
+    def get_track_sectors(self, track_no):
+        """return sector data of track"""
+        try:
+            return self.modified_tracks[track_no]
+        except KeyError:
+            pass
+        try:
+            data = self.cache.pop(track_no)
+        except KeyError:
+            data = self.hfe.extract_track_sectors(track_no, self.hfe.get_track(track_no))
+            if len(self.cache) >= HFESectors.CACHED_TRACKS:
+                del self.cache[next(iter(self.cache))]
+        self.cache[track_no] = data
+        return data
+
+    def read_sectors(self, start, count):
+        """return contents of count sectors beginning with sector start"""
+        first, offset = divmod(start, self.sectors_per_track)
+        last = Util.used(start + count, self.sectors_per_track)
+        data = b''.join(bytes(self.get_track_sectors(track_no)) for track_no in range(first, last))
+        return data[offset * 256:(offset + count) * 256]
+
+    def write_sector(self, sector_no, data):
+        """replace contents of sector"""
+        track_no, offset = divmod(sector_no, self.sectors_per_track)
+        track = bytearray(self.get_track_sectors(track_no))
+        track[offset * 256:(offset + 1) * 256] = data
+        self.modified_tracks[track_no] = track
+
+    def __len__(self):
+        return self.sectors * 256
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            index = range(len(self))[index]  # normalize index, also checks range
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            return bytes(self)[index]
+        if start >= stop:
+            return b''
+        first, last = start // 256, Util.used(stop, 256)
+        return self.read_sectors(first, last - first)[start - first * 256:stop - first * 256]
+
+    def __setitem__(self, index, data):
+        start, stop, step = index.indices(len(self))
+        if step != 1 or start % 256 or stop - start != 256 or len(data) != 256:
+            raise ValueError('Can only replace single sectors')
+        self.write_sector(start // 256, bytes(data))
+
+    def __bytes__(self):
+        return self.read_sectors(0, self.sectors)
+
+    def get_changes(self):
+        """return changed parts of HFE image as list of (offset, data), or None if geometry has changed"""
+        hfe = self.hfe
+        sector_0 = self.read_sectors(0, 1)
+        tracks, sides = sector_0[xdm.Disk.TRACKS_PER_SIDE], sector_0[xdm.Disk.SIDES]
+        dd = sector_0[xdm.Disk.DENSITY] == 2
+        if (tracks, sides, dd) != (hfe.tracks, hfe.sides, hfe.dd):
+            return None
+        changes = []
+        protected = b'\x00' if sector_0[xdm.Disk.DISK_PROTECTED:xdm.Disk.DISK_PROTECTED + 1] == b'P' else b'\xff'
+        if hfe.header[HFEDisk.WRITE_PROTECTED:HFEDisk.WRITE_PROTECTED + 1] != protected:
+            changes.append((HFEDisk.WRITE_PROTECTED, protected))
+        fmt = DDFormat if dd else SDFormat
+        for track_no, data in sorted(self.modified_tracks.items()):
+            stream = HFEDisk.create_track(fmt, tracks, track_no, data)
+            for i, offset in enumerate(hfe.get_track_offsets(track_no)):
+                chunk = stream[i * 256:(i + 1) * 256]
+                if hfe.trackdata[offset:offset + 256] != chunk:
+                    changes.append((HFEDisk.HEADER_LEN + offset, chunk))
+        return changes
+
+
+class RHFEDisk(RContainer):
+    """output container for HFE image of delegated disk, only writes modified tracks back to original image file"""
+
+    def __init__(self, sectors, name):
+        super().__init__(None, name, iscontainer=True)
+        self.sectors = sectors
+
+    def write(self, output=None, encoding=None):
+        changes = self.sectors.get_changes()
+        if changes is None:
+            self.data = HFEDisk.create_from_disk(bytes(self.sectors))  # re-encode all tracks
+        elif output or self.output:
+            hfe = self.sectors.hfe
+            image = bytearray(hfe.header + hfe.lut + hfe.trackdata)
+            for offset, data in changes:
+                image[offset:offset + len(data)] = data
+            self.data = bytes(image)
+        else:
+            with open(self.name, 'r+b') as f:
+                for offset, data in changes:
+                    f.seek(offset)
+                    f.write(data)
+            return
+        super().write(output=output, encoding=encoding)
 
 
 class Xhm99Console(Console):
@@ -514,6 +674,10 @@ class Xhm99Console(Console):
     def __init__(self, colors=None):
         super().__init__('xhm99', VERSION, colors=colors)
 
+    def warn(self, message):
+        """record warning message"""
+        super().warn(None, 'Warning: ' + message)
+
     def error(self, message):
         """record error message"""
         super().error(None, message)
@@ -544,6 +708,8 @@ class Xhm99Processor(CommandProcessor):
                          help='convert HFE images to disk images')
         cmd.add_argument('-I', '--hfe-info', action=GlobStore, dest='hfeinfo', nargs='+', metavar='<file>',
                          help='show basic information about HFE images')
+        cmd.add_argument('-V', '--verify-hfe', action=GlobStore, dest='verifyhfe', nargs='+', metavar='<file>',
+                         help='check sector CRCs of HFE images only')
         cmd.add_argument('--dump', action=GlobStore, dest='dump', nargs='+', metavar='<file>',
                          help=argparse.SUPPRESS)
 
@@ -573,6 +739,8 @@ class Xhm99Processor(CommandProcessor):
             self.tohfe()
         elif self.opts.fromhfe:
             self.fromhfe()
+        elif self.opts.verifyhfe:
+            self.verify()
         elif self.opts.dump:
             self.dump()
         else:
@@ -582,13 +750,20 @@ class Xhm99Processor(CommandProcessor):
         """delegate to xdm99"""
         try:
             image = Util.readdata(self.opts.filename)
-            disk = HFEDisk(image).to_disk_image()
+            hfe = HFEDisk(image)
+            disk = HFESectors(hfe)  # decodes tracks only when accessed
         except IOError:
+            hfe = None
             disk = bytes(1)  # dummy, includes -X case
         xdm_processor = xdm.Xdm99Processor()
         xdm_result, self.rc = xdm_processor.main(disk)  # local sys.argv will be passed to xdm99
+        if hfe:
+            self.warn_crc_errors(self.opts.filename, hfe.crc_errors)
         for item in xdm_result:
-            if item.iscontainer:
+            if isinstance(item, xdm.RDisk) and item.disk.image is disk:
+                # HFE image still holds disk, so only write back modified tracks
+                self.result.append(RHFEDisk(disk, item.name))
+            elif item.iscontainer:
                 # convert disk results into HFE disks
                 hfedisk = HFEDisk.create_from_disk(item.data)
                 self.result.append(RContainer(hfedisk, item.name, item.ext, istext=item.istext, iscontainer=True,
@@ -600,7 +775,9 @@ class Xhm99Processor(CommandProcessor):
     def fromhfe(self):
         for path in self.opts.fromhfe:
             hfe_image = Util.readdata(path)
-            dsk = HFEDisk(hfe_image).to_disk_image()
+            hfe = HFEDisk(hfe_image)
+            dsk = hfe.to_disk_image()
+            self.warn_crc_errors(path, hfe.crc_errors)
             barename, _ = os.path.splitext(os.path.basename(path))
             self.result.append(RContainer(dsk, barename, ext='.dsk_id'))
 
@@ -611,6 +788,17 @@ class Xhm99Processor(CommandProcessor):
             barename, _ = os.path.splitext(os.path.basename(path))
             self.result.append(RContainer(hfe, barename, ext='.hfe'))
 
+    def verify(self):
+        for path in self.opts.verifyhfe:
+            image = Util.readdata(path)
+            for sector, field in HFEDisk(image).verify_sectors():
+                self.console.error(f'{path}: CRC error in {field} field of sector {sector}')
+
+    def warn_crc_errors(self, path, crc_errors):
+        """report sectors with CRC errors"""
+        for sector, field in sorted(crc_errors):
+            self.console.warn(f'{path}: CRC error in {field} field of sector {sector}')
+
     def dump(self):
         for path in self.opts.dump:
             image = Util.readdata(path)
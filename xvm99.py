@@ -22,7 +22,16 @@
 import sys
 import os.path
 import re
+import stat
 import argparse
+import mmap
+import sqlite3
+import multiprocessing
+import hashlib
+from copy import copy
+from contextlib import contextmanager
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import xdm99 as xdm
 from xcommon import Util, CommandProcessor, RContainer, Warnings, Console
 
@@ -41,21 +50,26 @@ class Volumes:
     BYTES_PER_DISK = SECTORS_PER_VOLUME * xdm.Disk.BYTES_PER_SECTOR
     BYTES_PER_VOLUME = 2 * BYTES_PER_DISK
 
-    def __init__(self, device):
+    HEADER_LEN = 2 * xdm.Disk.BYTES_PER_SECTOR  # sector 0 of volume
+
+    def __init__(self, device, cache=None):
         self.device = device
+        self.cache = cache
 
     def get_volume(self, vol_no, keepsize=False):
         """get disk image from volume device"""
+        data = bytearray(self.BYTES_PER_VOLUME)
         with open(self.device, 'rb') as f:
             f.seek((vol_no - 1) * self.BYTES_PER_VOLUME)
-            data = f.read(self.BYTES_PER_VOLUME)
-        image = data[::2]  # only every second byte is used
+            size = f.readinto(data)
+        image = bytes(memoryview(data)[:size:2])  # only every second byte is used
         return xdm.Disk.trim_sectors(image) if keepsize else image
 
-    def write_volume(self, vol_no, image, keepsize=False, console=None):
-        """write disk image to volume device"""
-        size = len(image) * 2
-        if size > self.BYTES_PER_VOLUME:
+    def write_volume(self, vol_no, image, keepsize=False, console=None, original=None, dry_run=False):
+        """write disk image to volume device, only writing sectors that differ from original volume image if given,
+           return number of sectors (to be) written
+        """
+        if len(image) > self.BYTES_PER_DISK:
             raise ValueError('Disk image too large')
         if not keepsize:
             # use CF disk geometry and maximum sector count
@@ -63,43 +77,169 @@ class Volumes:
             disk.set_geometry(cf=True)
             disk.resize_disk(Volumes.SECTORS_PER_VOLUME)
             image = disk.get_image()
-        data = b''.join(bytes((b, 0)) for b in image) + bytes(self.BYTES_PER_VOLUME - size)
+        image = bytes(image) + bytes(self.BYTES_PER_DISK - len(image))  # remaining sectors are cleared
+        if original is None:
+            runs = [(0, self.SECTORS_PER_VOLUME)]
+        else:
+            runs = Volumes.changed_runs(original, image)
+        count = sum(sectors for _, sectors in runs)
+        if dry_run or not runs:
+            return count
         with open(self.device, 'r+b') as d:
-            d.seek((vol_no - 1) * self.BYTES_PER_VOLUME)
-            d.write(data)
+            for start, sectors in runs:
+                offset = start * xdm.Disk.BYTES_PER_SECTOR
+                data = bytearray(2 * sectors * xdm.Disk.BYTES_PER_SECTOR)  # only every second byte is used
+                data[::2] = image[offset:offset + sectors * xdm.Disk.BYTES_PER_SECTOR]
+                d.seek((vol_no - 1) * self.BYTES_PER_VOLUME + 2 * offset)
+                d.write(data)
+        if self.cache:
+            self.cache.invalidate([vol_no])
+        return count
 
-    def get_info(self, volumes, extended=True):
-        """get short disk info for individual volumes"""
-        info = []
+    @staticmethod
+    def changed_runs(original, image):
+        """return runs of sectors of image that differ from original image as list of (first sector, sector count)"""
+        runs = []
+        original, image = memoryview(original), memoryview(image)
+        for sector in range(len(image) // xdm.Disk.BYTES_PER_SECTOR):
+            offset = sector * xdm.Disk.BYTES_PER_SECTOR
+            if original[offset:offset + xdm.Disk.BYTES_PER_SECTOR] != image[offset:offset + xdm.Disk.BYTES_PER_SECTOR]:
+                if runs and sum(runs[-1]) == sector:
+                    runs[-1] = runs[-1][0], runs[-1][1] + 1
+                else:
+                    runs.append((sector, 1))
+        return runs
+
+    def get_size(self):
+        """get size of device in bytes"""
         with open(self.device, 'rb') as d:
-            if not volumes:
-                # show all volumes
-                d.seek(0, 2)  # go to end of device
-                device_size = d.tell()
-                volumes = list(range(1, (device_size + self.BYTES_PER_VOLUME - 1) // self.BYTES_PER_VOLUME + 1))
+            d.seek(0, 2)  # go to end of device, also works for block devices
+            return d.tell()
+
+    def get_volume_count(self):
+        """get number of volumes on device, including partial last volume"""
+        return (self.get_size() + self.BYTES_PER_VOLUME - 1) // self.BYTES_PER_VOLUME
+
+    def read_headers(self, volumes, jobs=None):
+        """read sector 0 of volumes"""
+        return self._read_parallel(self._read_headers, volumes, jobs)
+
+    def read_header_hashes(self, volumes, jobs=None):
+        """compute checksums of sector 0, file descriptor index, and file descriptors of volumes, or None for
+           unformatted volumes
+        """
+        return self._read_parallel(self._read_header_hashes, volumes, jobs)
+
+    @staticmethod
+    def _read_parallel(read_fn, volumes, jobs):
+        """split volumes into contiguous runs for parallel readers"""
+        if not jobs or jobs <= 1 or len(volumes) <= 1:
+            return read_fn(volumes)
+        run_len = (len(volumes) + jobs - 1) // jobs
+        with ThreadPoolExecutor(jobs) as pool:
+            runs = pool.map(read_fn, [volumes[i:i + run_len] for i in range(0, len(volumes), run_len)])
+            return [entry for run in runs for entry in run]
+
+    @contextmanager
+    def _reader(self):
+        """return function reading from memory mapped device, or by seeking if device cannot be mapped"""
+        with open(self.device, 'rb') as d:
+            d.seek(0, 2)
+            size = d.tell()
+            try:
+                data = mmap.mmap(d.fileno(), size, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):  # empty or unmappable device
+                data = None
+
+            def read(offset, length):
+                if offset < 0:
+                    return b''
+                if data is not None:
+                    return data[offset:offset + length]
+                d.seek(offset)
+                return d.read(length)
+
+            try:
+                yield read
+            finally:
+                if data is not None:
+                    data.close()
+
+    def _read_headers(self, volumes):
+        """read sector 0 of volumes"""
+        with self._reader() as read:
+            return [read((volume - 1) * self.BYTES_PER_VOLUME, self.HEADER_LEN) for volume in volumes]
+
+    def _read_header_hashes(self, volumes):
+        """compute checksums of catalog sectors of volumes"""
+        sector_len = 2 * xdm.Disk.BYTES_PER_SECTOR  # interleaved sector
+        hashes = []
+        with self._reader() as read:
             for volume in volumes:
-                try:
-                    d.seek((volume - 1) * self.BYTES_PER_VOLUME)
-                    sector_0 = d.read(xdm.Disk.BYTES_PER_SECTOR * 2 if extended else 0x10 * 2)
-                    if sector_0[0x0d * 2:0x10 * 2:2] == b'DSK':
-                        try:
-                            name = sector_0[:0x0a * 2:2].decode()
-                        except UnicodeDecodeError:
-                            name = ''.join(chr(b) if 0x20 <= b < 0x7f else '.' for b in sector_0[:0x0a * 2:2])
-                        if extended:
-                            total = (sector_0[0x0a * 2] << 8) | sector_0[0x0b * 2]
-                            used = 0
-                            for j in range(xdm.Util.used(total, 8)):
-                                used += bin(sector_0[(0x38 + j) * 2]).count('1')
-                            info.append(f'[{volume:4d}]  {name:10s}:  {used:4d} used  {total-used:4d} free\n')
-                        else:
-                            info.append(f'[{volume:4d}]  {name:10s}')
-                    else:
-                        info.append(f'[{volume:4d}]  (not a valid disk image)\n')
-                except IndexError:
-                    info.append(f'[{volume:4d}]  (invalid volume)\n')
+                offset = (volume - 1) * self.BYTES_PER_VOLUME
+                sectors = read(offset, 2 * sector_len)[::2]  # sectors 0 and 1
+                if len(sectors) < 2 * xdm.Disk.BYTES_PER_SECTOR or sectors[0x0d:0x10] != b'DSK':
+                    hashes.append(None)
+                    continue
+                checksum = hashlib.sha1(sectors)
+                for i in range(xdm.Disk.BYTES_PER_SECTOR, 2 * xdm.Disk.BYTES_PER_SECTOR, 2):
+                    fd_index = Util.ordn(sectors[i:i + 2])
+                    if fd_index == 0:
+                        break
+                    if fd_index < self.SECTORS_PER_VOLUME:
+                        checksum.update(read(offset + fd_index * sector_len, sector_len)[::2])
+                hashes.append(checksum.hexdigest())
+        return hashes
+
+    @staticmethod
+    def parse_header(sector_0):
+        """get name, total and used sectors from interleaved sector 0, or None for unavailable values"""
+        if sector_0[0x0d * 2:0x10 * 2:2] != b'DSK':
+            return None, None, None
+        try:
+            name = sector_0[:0x0a * 2:2].decode()
+        except UnicodeDecodeError:
+            name = ''.join(chr(b) if 0x20 <= b < 0x7f else '.' for b in sector_0[:0x0a * 2:2])
+        try:
+            total = (sector_0[0x0a * 2] << 8) | sector_0[0x0b * 2]
+        except IndexError:
+            return name, None, None
+        bitmap = sector_0[0x38 * 2::2]
+        if xdm.Util.used(total, 8) > len(bitmap):
+            return name, None, None  # allocation map corrupted
+        used = xdm.AllocationMap(bitmap).count(0, xdm.Util.used(total, 8) * 8)
+        return name, total, used
+
+    def get_info(self, volumes, extended=True, jobs=None):
+        """get short disk info for individual volumes"""
+        if not volumes:
+            # show all volumes
+            volumes = list(range(1, self.get_volume_count() + 1))
+        entries = self.cache.get(volumes) if self.cache else {}
+        missing = [volume for volume in dict.fromkeys(volumes) if volume not in entries]
+        if missing:
+            scanned = dict(zip(missing, map(Volumes.parse_header, self.read_headers(missing, jobs))))
+            if self.cache:
+                self.cache.put(scanned)
+            entries.update(scanned)
+        info = []
+        for volume in volumes:
+            name, total, used = entries[volume]
+            if name is None:
+                info.append(f'[{volume:4d}]  (not a valid disk image)\n')
+            elif not extended:
+                info.append(f'[{volume:4d}]  {name:10s}')
+            elif total is None:
+                info.append(f'[{volume:4d}]  (invalid volume)\n')
+            else:
+                info.append(f'[{volume:4d}]  {name:10s}:  {used:4d} used  {total-used:4d} free\n')
         return ''.join(info)
 
+    @staticmethod
+    def write_info(volume, count):
+        """describe sectors to be written for dry run"""
+        return f'[{volume:4d}]  {count:4d} sectors would be written\n'
+
     @staticmethod
     def parse_volume_range(vol_range):
         volumes = []
@@ -116,19 +256,80 @@ class Volumes:
         return volumes
 
 
-# Command line processing
+class VolumeCache:
+    """persistent directory of volume headers, stored as sqlite database and keyed by device identity"""
 
-class RVolume:
-    """output container wrapper for xvm99"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS devices (
+            id INTEGER PRIMARY KEY, path TEXT UNIQUE, dev INTEGER, ino INTEGER, size INTEGER, mtime INTEGER);
+        CREATE TABLE IF NOT EXISTS volumes (
+            device INTEGER, volume INTEGER, name TEXT, total INTEGER, used INTEGER, PRIMARY KEY (device, volume));
+    """
 
-    def __init__(self, volume, container):
-        self.volume = volume
-        self.container = container
+    def __init__(self, device, filename=None):
+        self.path = os.path.realpath(device)
+        self.filename = filename or Util.cache_filename('xvm99-volumes.db')
+        if os.path.dirname(self.filename):
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        self.db = sqlite3.connect(self.filename)
+        self.db.executescript(VolumeCache.SCHEMA)
+        self.device_id = self._validate()
 
-    def iscontainer(self):
-        return self.container.iscontainer
+    @staticmethod
+    def is_reliable(device):
+        """can changes of device be detected by size and modification time?
+           Block devices report neither, in particular for cards written in another machine.
+        """
+        return stat.S_ISREG(os.stat(device).st_mode)
+
+    def _identity(self):
+        """return identity of device that changes whenever device is modified"""
+        st = os.stat(self.path)
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _validate(self):
+        """drop cached volumes if device has been changed or replaced since last use, return device id"""
+        identity = self._identity()
+        with self.db:
+            row = self.db.execute('SELECT id, dev, ino, size, mtime FROM devices WHERE path = ?',
+                                  (self.path,)).fetchone()
+            if row is None:
+                return self.db.execute('INSERT INTO devices (path, dev, ino, size, mtime) VALUES (?, ?, ?, ?, ?)',
+                                       (self.path, *identity)).lastrowid
+            if tuple(row[1:]) != identity:
+                self.db.execute('DELETE FROM volumes WHERE device = ?', row[:1])
+                self.db.execute('UPDATE devices SET dev = ?, ino = ?, size = ?, mtime = ? WHERE id = ?',
+                                (*identity, row[0]))
+            return row[0]
+
+    def get(self, volumes):
+        """return cached (name, total, used) entries of volumes"""
+        wanted = set(volumes)
+        return {volume: (name, total, used)
+                for volume, name, total, used in self.db.execute(
+                    'SELECT volume, name, total, used FROM volumes WHERE device = ?', (self.device_id,))
+                if volume in wanted}
+
+    def put(self, entries):
+        """store (name, total, used) entries of volumes"""
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO volumes VALUES (?, ?, ?, ?, ?)',
+                                [(self.device_id, volume, *entry) for volume, entry in entries.items()])
+
+    def invalidate(self, volumes):
+        """forget volumes written by this process, but keep other volumes valid for modified device"""
+        with self.db:
+            self.db.executemany('DELETE FROM volumes WHERE device = ? AND volume = ?',
+                                [(self.device_id, volume) for volume in volumes])
+            self.db.execute('UPDATE devices SET dev = ?, ino = ?, size = ?, mtime = ? WHERE id = ?',
+                            (*self._identity(), self.device_id))
+
+    def close(self):
+        self.db.close()
 
 
+# Command line processing
+
 class Xvm99Console(Console):
     """collects errors and warnings"""
 
@@ -149,6 +350,7 @@ class Xvm99Processor(CommandProcessor):
         self.xdm_console = None
         self.default_opts = None
         self.volumes = []
+        self.jobs = None
 
     def parse(self):
         args = argparse.ArgumentParser(
@@ -171,6 +373,20 @@ class Xvm99Processor(CommandProcessor):
                           help='initialize volume (CF or sector count or disk geometry xSxDxT)')
         args.add_argument('--keep-size', action='store_true', dest='keepsize',
                           help="don't resize image when writing to volume")
+        args.add_argument('-j', '--jobs', dest='jobs', metavar='<count>',
+                          help='number of parallel jobs for reading volumes and running xdm99 commands')
+        args.add_argument('--no-cache', action='store_true', dest='nocache',
+                          help="don't use or update cached volume directory")
+        args.add_argument('--cache', action='store_true', dest='cache',
+                          help='also use cached volume directory for block devices')
+        args.add_argument('--dry-run', action='store_true', dest='dryrun',
+                          help="don't write volumes, but show number of sectors that would be written")
+        args.add_argument('--index', action='store_true', dest='index',
+                          help='add or refresh volumes in catalog index')
+        args.add_argument('--find', dest='find', nargs='+', metavar='<name>',
+                          help='find files of volumes in catalog index')
+        args.add_argument('--index-file', dest='indexfile', metavar='<file>',
+                          help='location of catalog index')
         args.add_argument('-c', '--encoding', dest='encoding', nargs='?', const='utf-8', metavar='<encoding>',
                           help='set encoding for DISPLAY files')
         args.add_argument('--color', action='store', dest='color', choices=['off', 'on'],
@@ -187,14 +403,25 @@ class Xvm99Processor(CommandProcessor):
     def run(self):
         self.console = Xvm99Console(colors=self.opts.color)
         self.xdm_console = xdm.Xdm99Console(Warnings(setall=True), colors=self.opts.color)
-        self.device = Volumes(self.opts.device)
+        try:
+            self.jobs = Util.xint(self.opts.jobs) if self.opts.jobs else None
+        except ValueError:
+            raise xdm.ContainerError('Invalid job count: ' + self.opts.jobs)
         self.volumes = Volumes.parse_volume_range(self.opts.volumes)
+        try:
+            use_cache = not self.opts.nocache and (self.opts.cache or VolumeCache.is_reliable(self.opts.device))
+            cache = VolumeCache(self.opts.device) if use_cache else None
+        except (OSError, sqlite3.Error):
+            cache = None  # volume directory is only an accelerator, device errors are reported later
+        self.device = Volumes(self.opts.device, cache=cache)
 
     def prepare(self):
         if self.opts.writevol:
             self.write()
         elif self.opts.readvol:
             self.read()
+        elif self.opts.index or self.opts.find:
+            self.index()
         elif not self.opts.init and not self.xdm_opts:
             self.info()
         else:
@@ -203,7 +430,10 @@ class Xvm99Processor(CommandProcessor):
     def write(self):
         data = Util.readdata(self.opts.writevol)
         for volume in self.volumes:
-            self.device.write_volume(volume, data, keepsize=self.opts.keepsize, console=self.xdm_console)
+            count = self.device.write_volume(volume, data, keepsize=self.opts.keepsize, console=self.xdm_console,
+                                             original=self.device.get_volume(volume), dry_run=self.opts.dryrun)
+            if self.opts.dryrun:
+                self.result.append(RContainer(Volumes.write_info(volume, count), '-', istext=True))
 
     def read(self):
         for volume in self.volumes:
@@ -212,44 +442,160 @@ class Xvm99Processor(CommandProcessor):
             self.result.append(RContainer(image, 'tmp', suffix=suffix, output=self.opts.readvol))  # 'tmp' overwritten
 
     def info(self):
-        self.result.append(RContainer(self.device.get_info(self.volumes), '-', istext=True))
+        self.result.append(RContainer(self.device.get_info(self.volumes, jobs=self.jobs), '-', istext=True))
+
+    def index(self):
+        """refresh or query catalog index of volumes"""
+        index = xdm.CatalogIndex(self.opts.indexfile)
+        prefix = os.path.realpath(self.opts.device) + ':'  # volumes are indexed as <device>:<volume>
+        try:
+            if self.opts.index:
+                updated, removed = self.refresh_index(index, prefix)
+                self.result.append(RContainer(f'{updated} volumes indexed, {removed} volumes removed\n', '-',
+                                              istext=True))
+            if self.opts.find:
+                volumes = set(self.volumes)
+                found = []
+                for path, name, fmt, sectors, size, records in index.find(self.opts.find, prefix=prefix):
+                    volume = int(path[len(prefix):])
+                    if volume in volumes:
+                        recs = '' if fmt == 'PROGRAM' else f'{records:3d} recs'
+                        line = f'[{volume:4d}]  {name:10s} {sectors:4d}  {fmt:11s} {size:6d} B {recs:>9s}'
+                        found.append((volume, line.rstrip() + '\n'))
+                found.sort(key=lambda entry: entry[0])  # stable for names
+                self.result.append(RContainer(''.join(line for _, line in found), '-', istext=True))
+        finally:
+            index.close()
+
+    def refresh_index(self, index, prefix):
+        """catalog volumes whose catalog sectors changed, remove unformatted volumes, return number of updated and
+           removed volumes
+        """
+        volumes = list(dict.fromkeys(self.volumes))
+        known = index.hashes(prefix)
+        changed = []
+        updated = removed = 0
+        with index.db:
+            for volume, hash_ in zip(volumes, self.device.read_header_hashes(volumes, self.jobs)):
+                path = prefix + str(volume)
+                if hash_ is None:
+                    removed += index.remove(path)
+                elif known.get(path) != hash_:
+                    changed.append((volume, hash_))
+            if not changed:
+                return updated, removed
+            with multiprocessing.Pool(self.jobs) as pool:
+                catalogs = pool.imap(partial(index_job, self.opts.device), [volume for volume, _ in changed],
+                                     chunksize=8)
+                for (volume, hash_), (name, files, error) in zip(changed, catalogs):
+                    index.store(prefix + str(volume), None, None, hash_, name, files,
+                                volume=volume)  # invalid volumes without files
+                    if error:
+                        self.console.error(f'Volume {volume}: {error}')
+                    else:
+                        updated += 1
+        return updated, removed
 
     def delegate(self):
-        """delegate file operations to xdm99"""
+        """delegate file operations to xdm99, processing volumes in worker processes"""
         del (sys.argv[2])  # remove volume specifier from command line passed to xdm99
-        xdm_processor = xdm.Xdm99Processor()  # single instance will accumulate results
-        for volume in self.volumes:
-            if self.opts.init:
-                image = bytes(1)  # dummy disk image
+        for option in ('--keep-size', '--no-cache', '--cache', '--dry-run'):
+            if option in sys.argv:
+                sys.argv.remove(option)  # not known to xdm99
+        xdm_processor = xdm.Xdm99Processor()
+        xdm_processor.external_data = bytes(1)  # parse options for delegation
+        xdm_processor.external_options = self.default_opts
+        xdm_processor.parse()
+        job = partial(delegate_job, self.opts.device, xdm_processor.opts, self.opts.keepsize, self.opts.dryrun)
+        modified = []
+        try:
+            if len(self.volumes) == 1 or self.jobs == 1:
+                self.collect(map(job, self.volumes), modified)
             else:
-                image = self.device.get_volume(volume, keepsize=self.opts.keepsize)
-                if not xdm.Disk.is_formatted(image):
-                    self.console.error(f'Volume {volume} not formatted')
-                    self.rc = 1
-                    continue
-            results, _ = xdm_processor.main(image, self.default_opts)
-            # repackage as RVolume to store volume number
-            for result in results:
-                if result.iscontainer:
-                    self.result.append(RVolume(volume, result))
-                else:
-                    self.result.append(result)
-        self.console.merge(xdm_processor.console)
+                with multiprocessing.Pool(self.jobs) as pool:
+                    self.collect(pool.imap(job, self.volumes), modified)
+        finally:
+            if modified and self.device.cache:
+                self.device.cache.invalidate(modified)
+
+    def collect(self, jobs, modified):
+        """gather output and messages of delegated volumes in order of volumes"""
+        for volume, (results, console, rc, written, exit_) in zip(self.volumes, jobs):
+            if written and not self.opts.dryrun:
+                modified.append(volume)
+            if exit_ is not None:
+                sys.exit(exit_)
+            self.result.extend(results)
+            for severity, info, message, category in console.console:
+                if len(self.volumes) > 1:
+                    message = f'Volume {volume}: {message}'
+                self.console.console.append((severity, info, message, category))
+            self.console.errors |= console.errors
+            self.console.entries |= console.entries
+            self.rc = max(self.rc, rc)
 
     def output(self):
         try:
-            # disks written to device already handled in write()
+            # disks written to device already handled in write() and delegate()
             for item in self.result:
-                if isinstance(item, RVolume):
-                    # for delegated volume changes
-                    self.device.write_volume(item.volume, item.container.data, keepsize=True, console=self.console)
-                else:
-                    item.write(self.opts.output, self.opts.encoding)
+                item.write(self.opts.output, self.opts.encoding)
         except IOError as e:
             sys.exit(self.console.colstr(str(e)))
         self.console.print()
 
 
+def index_job(device, volume):
+    """read catalog of single volume in worker process"""
+    try:
+        name, files = xdm.CatalogIndex.catalog_image(Volumes(device).get_volume(volume))
+        return name, files, None
+    except IOError as e:
+        return None, None, f'{e.filename}: {e.strerror}'
+    except (xdm.ContainerError, xdm.FileError, IndexError) as e:
+        return None, None, str(e) or 'Invalid disk image'
+
+
+def delegate_job(device, opts, keepsize, dry_run, volume):
+    """run xdm99 on single volume in worker process, write back changed sectors of modified volume, return output,
+       messages, and number of sectors written
+    """
+    volumes = Volumes(device)  # no cache, invalidated by caller
+    processor = xdm.Xdm99Processor()
+    processor.opts = copy(opts)
+    processor.console = xdm.Xdm99Console(colors=opts.color)
+    written = 0
+    try:
+        if opts.init:
+            original = None  # write all sectors
+            processor.external_data = bytes(1)  # dummy disk image
+        else:
+            original = volumes.get_volume(volume)  # complete volume, compared against written image
+            image = xdm.Disk.trim_sectors(original) if keepsize else original
+            if not xdm.Disk.is_formatted(image):
+                processor.console.error(f'Volume {volume} not formatted')
+                return [], processor.console, 1, written, None
+            processor.external_data = image
+        processor.run()
+        processor.prepare()
+        results = []
+        for result in processor.result:
+            if result.iscontainer:
+                written += volumes.write_volume(volume, result.data, keepsize=True, console=processor.console,
+                                                original=original, dry_run=dry_run)
+            else:
+                results.append(result)
+        if dry_run:
+            results.append(RContainer(Volumes.write_info(volume, written), '-', istext=True))
+        return results, processor.console, processor.rc, written, None
+    except IOError as e:
+        processor.console.error(f'{e.filename}: {e.strerror}')
+    except (xdm.ContainerError, xdm.FileError) as e:
+        processor.console.error(str(e))
+    except SystemExit as e:
+        return [], processor.console, processor.rc, written, e.code  # abort processing
+    return [], processor.console, processor.rc, written, None
+
+
 if __name__ == '__main__':
     status = Xvm99Processor().main()
     sys.exit(status)